@@ -0,0 +1,101 @@
+"""In-process response cache for read endpoints with path-prefix invalidation."""
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, Tuple
+
+_MISSING = object()
+
+
+class ResponseCache:
+    """Thread-safe TTL cache keyed by request path.
+
+    Every drop bumps a generation counter; values computed before a drop are
+    discarded instead of stored, so a read racing a write cannot re-cache
+    stale state.
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self._maxsize = maxsize
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            return value
+
+    def set(self, key: str, value: Any, max_age: float, generation: int) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries.pop(key, None)
+            if len(self._entries) >= self._maxsize:
+                # Dicts keep insertion order: evict the oldest entry
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (time.monotonic() + max_age, value)
+
+    def drop(self, *prefixes: str) -> None:
+        """Invalidate every cached path starting with any of the prefixes."""
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._entries if key.startswith(prefixes)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+response_cache = ResponseCache()
+
+
+def cache_config(path: str, max_age: float) -> Callable:
+    """Cache a route's return value under `path`, formatted with the route's kwargs."""
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            key = path.format(**kwargs)
+            cached = response_cache.get(key)
+            if cached is not _MISSING:
+                return cached
+            generation = response_cache.generation
+            value = func(*args, **kwargs)
+            response_cache.set(key, value, max_age, generation)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def cache_drop(*paths: str) -> Callable:
+    """Invalidate cached paths (prefixes, formatted with the route's kwargs) after a write."""
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            try:
+                return func(*args, **kwargs)
+            finally:
+                response_cache.drop(*(path.format(**kwargs) for path in paths))
+
+        return wrapper
+
+    return decorator
+
+
+__all__ = ["ResponseCache", "response_cache", "cache_config", "cache_drop"]
@@ -1,7 +1,8 @@
-from typing import Any, Dict, List
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Tuple
 
 # Layout catalog for UI layouts. Each intent maps to ordered slots.
-LAYOUT_CATALOG: Dict[str, Dict[str, Any]] = {
+_LAYOUT_CATALOG_SPEC: Dict[str, Dict[str, Any]] = {
     "N1_FOCUS": {"topics": 1, "slots": [{"id": "A", "size": "L"}]},
     "N1_RELAXED": {"topics": 1, "slots": [{"id": "A", "size": "M"}]},
     "N2_SPLIT_EQUAL": {"topics": 2, "slots": [{"id": "A", "size": "M"}, {"id": "B", "size": "M"}]},
@@ -24,6 +25,29 @@ LAYOUT_CATALOG: Dict[str, Dict[str, Any]] = {
     },
 }
 
+# Read-only views are shared across requests; identical (id, size) slots reuse
+# a single mapping so every layout with an "M" slot "A" points at one object.
+_SLOT_CACHE: Dict[Tuple[str, str], Mapping[str, str]] = {}
+
+
+def _freeze_slot(slot: Dict[str, str]) -> Mapping[str, str]:
+    key = (slot["id"], slot["size"])
+    frozen = _SLOT_CACHE.get(key)
+    if frozen is None:
+        frozen = _SLOT_CACHE[key] = MappingProxyType(dict(slot))
+    return frozen
+
+
+def _freeze_layout(layout: Dict[str, Any]) -> Mapping[str, Any]:
+    frozen = dict(layout)
+    frozen["slots"] = tuple(_freeze_slot(slot) for slot in layout["slots"])
+    return MappingProxyType(frozen)
+
+
+LAYOUT_CATALOG: Mapping[str, Mapping[str, Any]] = MappingProxyType(
+    {intent: _freeze_layout(layout) for intent, layout in _LAYOUT_CATALOG_SPEC.items()}
+)
+
 DEFAULT_SESSION_ID = "demo-session"
 MAX_FRAMES = 4
 MAX_ITEMS_PER_FRAME = 6
@@ -1,35 +1,184 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import os
+from contextlib import contextmanager
+from typing import Iterator
+
+import orjson
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.schema import CreateColumn, CreateTable
+from sqlalchemy.orm import DeclarativeBase, Session, raiseload, sessionmaker
+from sqlalchemy.pool import QueuePool
 from pathlib import Path
 
 # Database file location
 DATABASE_DIR = Path(__file__).parent.parent
-DATABASE_URL = f"sqlite:///{DATABASE_DIR / 'app.db'}"
+DATABASE_PATH = DATABASE_DIR / "app.db"
+DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
+DATABASE_URL_RO = f"sqlite:///file:{DATABASE_PATH}?mode=ro&uri=true"
+# Bump when a mapped column or index is added; migrate_db() upgrades older files
+SCHEMA_VERSION = 2
+
+
+def _json_serializer(value) -> str:
+    return orjson.dumps(value).decode()
+
 
-# Create engine
-engine = create_engine(
+# JSON columns go through orjson instead of the stdlib json module
+_JSON_CODEC = {"json_serializer": _json_serializer, "json_deserializer": orjson.loads}
+
+# SQLite allows a single writer at a time, so writes go through one pooled
+# connection while reads get their own pool of read-only connections under WAL.
+# Overflow covers the GET /session* routes, which take a read-write session
+# because a read may create a missing session.
+engine_rw = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False},  # Needed for SQLite
+    connect_args={"check_same_thread": False},  # Pooled connections cross threads
+    poolclass=QueuePool,
+    pool_size=1,
+    max_overflow=10,
+    pool_pre_ping=True,
+    pool_recycle=1800,
     echo=False,  # Set to True for SQL query logging
+    **_JSON_CODEC,
+)
+
+engine_ro = create_engine(
+    DATABASE_URL_RO,
+    connect_args={"check_same_thread": False},
+    poolclass=QueuePool,
+    pool_size=10,
+    max_overflow=20,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    echo=False,
+    **_JSON_CODEC,
 )
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def _apply_common_pragmas(cursor) -> None:
+    cursor.execute("PRAGMA foreign_keys=ON")  # SQLite leaves FK enforcement off by default
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA busy_timeout=5000")
+
+
+@event.listens_for(engine_rw, "connect")
+def _set_sqlite_pragmas_rw(dbapi_connection, _connection_record) -> None:
+    """Tune each new SQLite connection: WAL for concurrent readers, fewer fsyncs."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    _apply_common_pragmas(cursor)
+    cursor.close()
+
+
+@event.listens_for(engine_ro, "connect")
+def _set_sqlite_pragmas_ro(dbapi_connection, _connection_record) -> None:
+    """Tune read-only connections (journal mode is owned by the writer)."""
+    cursor = dbapi_connection.cursor()
+    _apply_common_pragmas(cursor)
+    cursor.close()
+
+
+# Query options that turn any lazy load into an error (GENUI_RAISELOAD=1), so an
+# accidental N+1 fails loudly during development instead of slowing down requests
+RAISELOAD_GUARD = (raiseload("*"),) if os.getenv("GENUI_RAISELOAD") == "1" else ()
+
+# Create session factories
+SessionRW = sessionmaker(autocommit=False, autoflush=False, bind=engine_rw)
+SessionRO = sessionmaker(autocommit=False, autoflush=False, bind=engine_ro)
 
 # Base class for models
-Base = declarative_base()
+class Base(DeclarativeBase):
+    pass
+
+
+def _register_models() -> None:
+    # Importing the ORM models populates Base.metadata
+    import app.models.db  # noqa: F401
 
 
 def init_db() -> None:
     """Initialize database by creating all tables."""
-    Base.metadata.create_all(bind=engine)
+    _register_models()
+    Base.metadata.create_all(bind=engine_rw)
+
+
+def schema_exists() -> bool:
+    """Return True when every mapped table is already present in the database."""
+    _register_models()
+    inspector = inspect(engine_rw)
+    return all(inspector.has_table(table) for table in Base.metadata.tables)
+
+
+def _rebuild_table(conn, table, existing_columns: set[str]) -> None:
+    """Copy a table into a freshly created one (SQLite cannot add constraints in place)."""
+    old_name = f"_{table.name}_old"
+    conn.exec_driver_sql(f"ALTER TABLE {table.name} RENAME TO {old_name}")
+    conn.execute(CreateTable(table))
+    columns = ", ".join(
+        column.name for column in table.columns if column.name in existing_columns and column.computed is None
+    )
+    # Rows the new foreign keys would reject (e.g. events of deleted sessions) are dropped
+    conditions = " AND ".join(
+        f"{fk.parent.name} IN (SELECT {fk.column.name} FROM {fk.column.table.name})" for fk in table.foreign_keys
+    )
+    conn.exec_driver_sql(
+        f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old_name}"
+        + (f" WHERE {conditions}" if conditions else "")
+    )
+    conn.exec_driver_sql(f"DROP TABLE {old_name}")
+
+
+def migrate_db() -> None:
+    """
+    Bring tables created by an older build up to the mapped schema in place.
 
+    New columns are nullable, have a constant default or are VIRTUAL generated
+    columns, so SQLite can ADD COLUMN them; only a missing foreign key needs
+    the table copied. PRAGMA user_version records the schema revision, so an
+    up-to-date database costs a single pragma read.
+    """
+    _register_models()
+    with engine_rw.begin() as conn:
+        if conn.exec_driver_sql("PRAGMA user_version").scalar() >= SCHEMA_VERSION:
+            return
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            foreign_keys = {
+                (tuple(fk["constrained_columns"]), fk["referred_table"])
+                for fk in inspector.get_foreign_keys(table.name)
+            }
+            if any(
+                ((fk.parent.name,), fk.column.table.name) not in foreign_keys for fk in table.foreign_keys
+            ):
+                _rebuild_table(conn, table, existing)
+            else:
+                for column in table.columns:
+                    if column.name not in existing:
+                        column_ddl = CreateColumn(column).compile(dialect=conn.dialect)
+                        conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}")
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)  # CREATE INDEX only when missing
+        conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
-def get_db():
-    """Dependency for getting database session."""
-    db = SessionLocal()
+
+@contextmanager
+def session_scope(readonly: bool = False) -> Iterator[Session]:
+    """Open a pooled session for a unit of work and close it (returning the connection) on exit."""
+    db = SessionRO() if readonly else SessionRW()
     try:
         yield db
     finally:
         db.close()
+
+
+def get_db_rw():
+    """Dependency for getting a read-write database session."""
+    with session_scope() as db:
+        yield db
+
+
+def get_db_ro():
+    """Dependency for getting a read-only database session."""
+    with session_scope(readonly=True) as db:
+        yield db
@@ -1,41 +1,84 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from dotenv import load_dotenv
 
-from app.routers.session import router as session_router
-from app.database import init_db
+# Load .env before any app module is imported: several read their settings
+# (TOKENC_AGGRESSIVENESS, GENUI_RAISELOAD, GENUI_ACCUMULATED_*) at import time
+load_dotenv()
+
+from app.routers.session import router as session_router  # noqa: E402
+from app.database import init_db, migrate_db, schema_exists  # noqa: E402
+from app.services.event_service import PENDING_LEASE_SECONDS, fail_pending_events  # noqa: E402
 
 APP_TITLE = "Generative UI"
 ALLOWED_ORIGINS = ["http://localhost:5173"]
+ALLOWED_METHODS = ["GET", "POST", "DELETE"]
+ALLOWED_HEADERS = ["Content-Type", "Authorization"]
+CORS_MAX_AGE = 86400  # Let browsers cache preflight responses for a day
+GZIP_MINIMUM_SIZE = 1024
+GZIP_COMPRESS_LEVEL = 5
+OPENAI_API_KEY_CONFIGURED = bool(os.getenv("OPENAI_API_KEY"))
+# Another worker may die mid-generation at any time, so the stale-pending sweep repeats
+PENDING_SWEEP_INTERVAL = PENDING_LEASE_SECONDS / 2
+
+
+async def _sweep_stale_events() -> None:
+    while True:
+        await asyncio.sleep(PENDING_SWEEP_INTERVAL)
+        try:
+            stale_events = await asyncio.to_thread(fail_pending_events)
+        except Exception as e:
+            print(f"WARNING: stale pending event sweep failed: {e}")
+            continue
+        if stale_events:
+            print(f"WARNING: marked {stale_events} abandoned pending event(s) as failed.")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize database on startup and validate OpenAI API key."""
+    # Skip the CREATE TABLE round-trips when the schema is already in place
+    if not schema_exists():
+        init_db()
+    migrate_db()
+
+    # Generation tasks die with their worker; settle what was left pending past its lease
+    stale_events = fail_pending_events()
+    if stale_events:
+        print(f"WARNING: marked {stale_events} abandoned pending event(s) as failed.")
+    sweep_task = asyncio.create_task(_sweep_stale_events())
+
+    # Validate OpenAI API key on startup
+    if not OPENAI_API_KEY_CONFIGURED:
+        print("WARNING: OPENAI_API_KEY not set. LLM features will not work.")
+    else:
+        print("✓ OpenAI API key configured")
+    yield
+    sweep_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await sweep_task
 
 
 def create_app() -> FastAPI:
-    load_dotenv()
-    app = FastAPI(title=APP_TITLE)
+    app = FastAPI(title=APP_TITLE, lifespan=lifespan)
 
+    # Middleware added last runs outermost, so GZip is added before CORS
+    app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE, compresslevel=GZIP_COMPRESS_LEVEL)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=ALLOWED_ORIGINS,
         allow_credentials=True,
-        allow_methods=["*"],
-        allow_headers=["*"],
+        allow_methods=ALLOWED_METHODS,
+        allow_headers=ALLOWED_HEADERS,
+        max_age=CORS_MAX_AGE,
     )
 
     app.include_router(session_router)
 
-    @app.on_event("startup")
-    def startup_event():
-        """Initialize database on startup and validate OpenAI API key."""
-        init_db()
-        
-        # Validate OpenAI API key on startup
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            print("WARNING: OPENAI_API_KEY not set. LLM features will not work.")
-        else:
-            print("✓ OpenAI API key configured")
-
     @app.get("/")
     def root() -> dict[str, str]:
         return {"message": "ASR feature has been removed."}
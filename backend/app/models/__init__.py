@@ -1,48 +1,78 @@
-"""Models package - organized by type."""
-
-# Database models (SQLAlchemy)
-from app.models.db import SessionModel, InputEventModel
-
-# API schemas (Pydantic models for API requests/responses)
-from app.models.schemas import (
-    InputEvent,
-    ComponentNode,
-    UIState,
-    SessionState,
-    SessionSummary,
-    ComponentType,
-)
-
-# GenUI schema models (Pydantic models for GenUI validation)
-from app.models.genui import (
-    validate_genui_message,
-    validate_genui_message_list,
-    GenUIMessage,
-    SurfaceUpdate,
-    DataModelUpdate,
-    BeginRendering,
-    Component,
-    ComponentDefinition,
-)
-
-__all__ = [
+"""Models package - organized by type.
+
+Attributes are resolved lazily (PEP 562) so importing the package does not pull
+in every model module up front.
+"""
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    # Database models (SQLAlchemy)
+    from app.models.db import SessionModel, InputEventModel
+
+    # API schemas (Pydantic models for API requests/responses)
+    from app.models.schemas import (
+        InputEvent,
+        ComponentNode,
+        UIState,
+        SessionState,
+        SessionSummary,
+        ComponentType,
+        PENDING_STATUS,
+        PASSED_STATUS,
+        FAILED_STATUS,
+    )
+
+    # GenUI schema models (Pydantic models for GenUI validation)
+    from app.models.genui import (
+        validate_genui_message,
+        validate_genui_message_list,
+        dump_genui_message_list,
+        GenUIMessage,
+        SurfaceUpdate,
+        DataModelUpdate,
+        BeginRendering,
+        Component,
+        ComponentDefinition,
+    )
+
+_LAZY_ATTRS = {
     # Database models
-    "SessionModel",
-    "InputEventModel",
+    "SessionModel": "app.models.db",
+    "InputEventModel": "app.models.db",
     # API schemas
-    "InputEvent",
-    "ComponentNode",
-    "UIState",
-    "SessionState",
-    "SessionSummary",
-    "ComponentType",
+    "InputEvent": "app.models.schemas",
+    "ComponentNode": "app.models.schemas",
+    "UIState": "app.models.schemas",
+    "SessionState": "app.models.schemas",
+    "SessionSummary": "app.models.schemas",
+    "ComponentType": "app.models.schemas",
+    "PENDING_STATUS": "app.models.schemas",
+    "PASSED_STATUS": "app.models.schemas",
+    "FAILED_STATUS": "app.models.schemas",
     # GenUI models
-    "validate_genui_message",
-    "validate_genui_message_list",
-    "GenUIMessage",
-    "SurfaceUpdate",
-    "DataModelUpdate",
-    "BeginRendering",
-    "Component",
-    "ComponentDefinition",
-]
+    "validate_genui_message": "app.models.genui",
+    "validate_genui_message_list": "app.models.genui",
+    "dump_genui_message_list": "app.models.genui",
+    "GenUIMessage": "app.models.genui",
+    "SurfaceUpdate": "app.models.genui",
+    "DataModelUpdate": "app.models.genui",
+    "BeginRendering": "app.models.genui",
+    "Component": "app.models.genui",
+    "ComponentDefinition": "app.models.genui",
+}
+
+__all__ = list(_LAZY_ATTRS)
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value  # Cache so later lookups skip __getattr__
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -1,19 +1,69 @@
 """Database models (SQLAlchemy ORM)."""
-from sqlalchemy import Column, String, Integer, JSON
+import time
+from typing import Any, List, Optional
+
+from sqlalchemy import Computed, Float, ForeignKey, String, Integer, JSON, Index, Text
+from sqlalchemy import text as sql_text
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
 from app.database import Base
 
 
 class SessionModel(Base):
     __tablename__ = "sessions"
 
-    session_id = Column(String, primary_key=True, index=True)
-    seq_counter = Column(Integer, default=0, nullable=False)
+    session_id: Mapped[str] = mapped_column(String, primary_key=True, index=True)
+    seq_counter: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # Newline-joined delta summaries of completed events, appended as each one lands
+    deltas_summary_text: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # Surface replay state folded up to ui_snapshot_seq, so reads only replay newer
+    # events. Deferred as one group: the snapshot grows with the session and is only
+    # needed on a UI cache miss, and the pair must be read together to stay consistent.
+    ui_snapshot: Mapped[Optional[dict[str, Any]]] = mapped_column(
+        JSON, nullable=True, deferred=True, deferred_group="ui_snapshot"
+    )
+    ui_snapshot_seq: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False, deferred=True, deferred_group="ui_snapshot"
+    )
+
+    # Deleting a session leaves event removal to the ON DELETE CASCADE foreign key
+    events: Mapped[List["InputEventModel"]] = relationship(
+        order_by="InputEventModel.seq",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
 
 
 class InputEventModel(Base):
     __tablename__ = "input_events"
+    __table_args__ = (
+        # Serves `WHERE session_id = ? ORDER BY seq` (and session_id-only lookups via the prefix)
+        Index("ix_input_events_session_seq", "session_id", "seq"),
+        # Serves status-filtered scans in seq order (passed events for the UI replay)
+        Index("ix_input_events_session_status_seq", "session_id", "validation_status", "seq"),
+        # Keeps the stale-pending sweep to the (few) pending rows, oldest first
+        Index(
+            "ix_input_events_pending_created",
+            "created_at",
+            sqlite_where=sql_text("validation_status = 'pending'"),
+        ),
+    )
 
-    event_id = Column(String, primary_key=True, index=True)
-    session_id = Column(String, index=True, nullable=False)
-    seq = Column(Integer, nullable=False)
-    payload = Column(JSON, nullable=False)
+    event_id: Mapped[str] = mapped_column(String, primary_key=True, index=True)
+    session_id: Mapped[str] = mapped_column(
+        String, ForeignKey("sessions.session_id", ondelete="CASCADE"), nullable=False
+    )
+    seq: Mapped[int] = mapped_column(Integer, nullable=False)
+    payload: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False)
+    # Hot payload keys exposed by SQLite (3.31+) so queries can read them without
+    # shipping and re-parsing the whole JSON document. VIRTUAL, so older databases
+    # can ADD COLUMN them in place; indexes on them still store the values.
+    text: Mapped[Optional[str]] = mapped_column(
+        String, Computed("json_extract(payload, '$.text')", persisted=False)
+    )
+    validation_status: Mapped[Optional[str]] = mapped_column(
+        String, Computed("json_extract(payload, '$.validation_status')", persisted=False)
+    )
+    # Unix time the event was appended; NULL for rows that predate the column.
+    # Lets any worker tell a stale pending event from one still generating.
+    created_at: Mapped[Optional[float]] = mapped_column(Float, nullable=True, default=time.time)
@@ -1,6 +1,16 @@
 """Pydantic models for GenUI Schema v1.0 validation."""
-from typing import Literal, Union, Dict, Any, List
-from pydantic import BaseModel, Field, ConfigDict, ValidationError, model_validator
+from typing import Annotated, Literal, Union, Dict, Any, List
+from pydantic import (
+    BaseModel,
+    BeforeValidator,
+    ConfigDict,
+    Discriminator,
+    Field,
+    Tag,
+    TypeAdapter,
+    ValidationError,
+    model_validator,
+)
 
 
 # ============================================================================
@@ -158,15 +168,35 @@ class ImageComponent(GenUIBaseModel):
     Image: ImageProps
 
 
-# Union of all component types
-ComponentDefinition = Union[
-    ColumnComponent,
-    RowComponent,
-    CardComponent,
-    DividerComponent,
-    TextComponent,
-    IconComponent,
-    ImageComponent,
+def _component_kind(value: Any) -> str | None:
+    """Discriminate component variants by their single top-level key."""
+    if isinstance(value, dict):
+        if not value:
+            return "Divider"  # Divider props default to an empty object
+        return next(iter(value)) if len(value) == 1 else None
+    if isinstance(value, BaseModel):
+        return next(iter(type(value).model_fields), None)
+    return None
+
+
+# Union of all component types, tagged by component kind
+ComponentDefinition = Annotated[
+    Union[
+        Annotated[ColumnComponent, Tag("Column")],
+        Annotated[RowComponent, Tag("Row")],
+        Annotated[CardComponent, Tag("Card")],
+        Annotated[DividerComponent, Tag("Divider")],
+        Annotated[TextComponent, Tag("Text")],
+        Annotated[IconComponent, Tag("Icon")],
+        Annotated[ImageComponent, Tag("Image")],
+    ],
+    Discriminator(
+        _component_kind,
+        custom_error_type="unknown_component_type",
+        custom_error_message=(
+            "Component must contain exactly one of: Column, Row, Card, Divider, Text, Icon, Image"
+        ),
+    ),
 ]
 
 
@@ -180,9 +210,30 @@ class Component(GenUIBaseModel):
 # Message Types
 # ============================================================================
 
+# Lowercased message type -> canonical type string
+_CANONICAL_MESSAGE_TYPES: Dict[str, str] = {
+    "surfaceupdate": "surfaceUpdate",
+    "datamodelupdate": "dataModelUpdate",
+    "beginrendering": "beginRendering",
+}
+
+
+def _canonical_message_type(value: Any) -> Any:
+    """Accept message types in any casing (LLMs are not consistent about it)."""
+    if isinstance(value, str):
+        return _CANONICAL_MESSAGE_TYPES.get(value.lower(), value)
+    return value
+
+
+def _message_type_tag(value: Any) -> str | None:
+    message_type = value.get("type") if isinstance(value, dict) else getattr(value, "type", None)
+    if not isinstance(message_type, str):
+        return None
+    return _CANONICAL_MESSAGE_TYPES.get(message_type.lower())
+
 class SurfaceUpdate(GenUIBaseModel):
     """Surface update: declares UI structure for a surface."""
-    type: Literal["surfaceUpdate"]
+    type: Annotated[Literal["surfaceUpdate"], BeforeValidator(_canonical_message_type)]
     schemaVersion: SchemaVersion
     surface: SurfaceName
     components: List[Component]
@@ -190,50 +241,46 @@ class SurfaceUpdate(GenUIBaseModel):
 
 class DataModelUpdate(GenUIBaseModel):
     """Data model update: provides nested JSON data for binding."""
-    type: Literal["dataModelUpdate"]
+    type: Annotated[Literal["dataModelUpdate"], BeforeValidator(_canonical_message_type)]
     schemaVersion: SchemaVersion
     data: Dict[str, Any]
 
 
 class BeginRendering(GenUIBaseModel):
     """Begin rendering: signals that a surface is ready to be rendered."""
-    type: Literal["beginRendering"]
+    type: Annotated[Literal["beginRendering"], BeforeValidator(_canonical_message_type)]
     schemaVersion: SchemaVersion
     surface: SurfaceName
 
 
-# Union of all GenUI message types
-GenUIMessage = Union[SurfaceUpdate, DataModelUpdate, BeginRendering]
+# Union of all GenUI message types, tagged by (case-insensitive) message type
+GenUIMessage = Annotated[
+    Union[
+        Annotated[SurfaceUpdate, Tag("surfaceUpdate")],
+        Annotated[DataModelUpdate, Tag("dataModelUpdate")],
+        Annotated[BeginRendering, Tag("beginRendering")],
+    ],
+    Discriminator(
+        _message_type_tag,
+        custom_error_type="unknown_message_type",
+        custom_error_message=(
+            "Unknown message type. Expected 'surfaceUpdate', 'dataModelUpdate', or 'beginRendering'"
+        ),
+    ),
+]
+
+_MESSAGE_ADAPTER: TypeAdapter[GenUIMessage] = TypeAdapter(GenUIMessage)
+_MESSAGE_LIST_ADAPTER: TypeAdapter[List[GenUIMessage]] = TypeAdapter(List[GenUIMessage])
+
+# Message types every GenUI response must contain
+_REQUIRED_MESSAGE_TYPES = frozenset({"surfaceUpdate", "dataModelUpdate"})
 
 
 def _validate_single_message(data: Dict[str, Any]) -> GenUIMessage:
     try:
-        message_type = data.get("type")
-        if isinstance(message_type, str):
-            normalized = message_type.lower()
-            if normalized == "surfaceupdate":
-                data["type"] = "surfaceUpdate"
-            elif normalized == "datamodelupdate":
-                data["type"] = "dataModelUpdate"
-            elif normalized == "beginrendering":
-                data["type"] = "beginRendering"
-            message_type = data.get("type")
-        
-        if message_type == "surfaceUpdate":
-            return SurfaceUpdate.model_validate(data)
-        elif message_type == "dataModelUpdate":
-            return DataModelUpdate.model_validate(data)
-        elif message_type == "beginRendering":
-            return BeginRendering.model_validate(data)
-        else:
-            raise ValueError(
-                f"Unknown message type: {message_type}. Expected 'surfaceUpdate', "
-                "'dataModelUpdate', or 'beginRendering'"
-            )
+        return _MESSAGE_ADAPTER.validate_python(data)
     except ValidationError as e:
         raise ValueError(f"GenUI schema validation failed: {e}") from e
-    except Exception as e:
-        raise ValueError(f"GenUI schema validation failed: {str(e)}") from e
 
 
 # ============================================================================
@@ -265,18 +312,26 @@ def validate_genui_message_list(data: Any) -> List[GenUIMessage]:
     if not isinstance(data, list):
         raise ValueError("Expected LLM response to be a JSON array of GenUI messages.")
     
-    validated_messages: List[GenUIMessage] = []
-    for index, item in enumerate(data):
-        if not isinstance(item, dict):
-            raise ValueError(f"Message at index {index} must be a JSON object.")
-        validated_messages.append(_validate_single_message(item))
+    try:
+        validated_messages = _MESSAGE_LIST_ADAPTER.validate_python(data)
+    except ValidationError as e:
+        raise ValueError(f"GenUI schema validation failed: {e}") from e
     
-    message_types = {message.type for message in validated_messages}
-    required_types = {"surfaceUpdate", "dataModelUpdate"}
-    missing = sorted(required_types - message_types)
+    missing = _REQUIRED_MESSAGE_TYPES - {message.type for message in validated_messages}
     if missing:
         raise ValueError(
-            "GenUI response missing required message types: " + ", ".join(missing)
+            "GenUI response missing required message types: " + ", ".join(sorted(missing))
         )
     
     return validated_messages
+
+
+def dump_genui_message_list(messages: List[GenUIMessage], mode: str = "python") -> List[Dict[str, Any]]:
+    """
+    Serialize validated GenUI messages back to plain dicts in a single pass.
+    
+    Args:
+        messages: Models returned by validate_genui_message_list.
+        mode: Pydantic dump mode ("python" or "json").
+    """
+    return _MESSAGE_LIST_ADAPTER.dump_python(messages, mode=mode)
@@ -1,10 +1,15 @@
 """API schemas (Pydantic models for request/response validation)."""
 from typing import Any, Dict, List, Literal
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 ComponentType = Literal["Column", "Row", "Card", "Divider", "Text", "Icon", "Image"]
 
+# payload["validation_status"] of an input event
+PENDING_STATUS = "pending"  # LLM response still being generated
+PASSED_STATUS = "passed"  # Response validated; the only events the UI replays
+FAILED_STATUS = "failed"  # Generation or validation failed; kept for debugging
+
 
 class InputEvent(BaseModel):
     event_id: str
@@ -14,6 +19,8 @@ class InputEvent(BaseModel):
 
 
 class ComponentNode(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     id: str
     type: ComponentType
     props: Dict[str, Any] = Field(default_factory=dict)
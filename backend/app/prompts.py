@@ -1,5 +1,4 @@
 """Prompt templates for LLM interactions."""
-import json
 
 GENUI_SYSTEM_PROMPT = """You are a UI generation assistant that creates UI specifications in GenUI schema format.
 
@@ -178,34 +177,24 @@ Output Requirements
 - Every message MUST include required fields
 """
 
-def get_genui_user_prompt(
-    accumulated_text: str,
-    current_text: str,
-    deltas_summary: str | None = None,
-) -> str:
-    """
-    Generate user prompt for GenUI JSON generation.
+# Placeholder for empty prompt sections
+_EMPTY_SECTION = "(none)"
 
-    Args:
-        accumulated_text: All prior user input accumulated over time
-        current_text: The most recent user input
-        deltas_summary: Short summaries of prior UI updates
-
-    Returns:
-        Formatted user prompt string
-    """
-    return f"""Based on the following user input, generate a GenUI schema JSON response.
+# Context prompt template. It is sent as its own message right after the system
+# prompt so the two form a prefix that repeats verbatim across requests and
+# stays eligible for provider-side prompt caching.
+_GENUI_CONTEXT_PROMPT_TEMPLATE = """Accumulated context (prior user input):
+{accumulated_text}
+"""
 
-Accumulated context:
-{accumulated_text if accumulated_text else "(none)"}
+# User prompt template; `{{text}}` survives formatting as the literal `{text}`
+# slot that the LLM service fills with the current input.
+_GENUI_USER_PROMPT_TEMPLATE = """Based on the accumulated context (if any) and the following user input, generate a GenUI schema JSON response.
 
 Update summaries (prior UI changes):
-{deltas_summary if deltas_summary else "(none)"}
+{deltas_summary}
 
 Current input:
-{current_text}
-
-Full input (accumulated + current):
 {{text}}
 
 Image handling:
@@ -228,3 +217,33 @@ The messages array MUST include:
 - at least one DataModelUpdate
 - optional BeginRendering when appropriate
 """
+
+
+def get_genui_context_prompt(accumulated_text: str) -> str | None:
+    """
+    Generate the accumulated-context prompt for GenUI JSON generation.
+
+    Args:
+        accumulated_text: All prior user input accumulated over time
+
+    Returns:
+        Formatted context prompt, or None when there is no prior input
+    """
+    if not accumulated_text:
+        return None
+    return _GENUI_CONTEXT_PROMPT_TEMPLATE.format_map({"accumulated_text": accumulated_text})
+
+
+def get_genui_user_prompt(deltas_summary: str | None = None) -> str:
+    """
+    Generate user prompt template for GenUI JSON generation.
+
+    Args:
+        deltas_summary: Short summaries of prior UI updates
+
+    Returns:
+        User prompt with a `{text}` slot for the current input
+    """
+    return _GENUI_USER_PROMPT_TEMPLATE.format_map({
+        "deltas_summary": deltas_summary or _EMPTY_SECTION,
+    })
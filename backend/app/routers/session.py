@@ -1,52 +1,79 @@
-from typing import Dict
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
 
+from app.cache import cache_config, cache_drop
 from app.config.layouts import DEFAULT_SESSION_ID
+from app.database import get_db_ro, get_db_rw
 from app.models import InputEvent, SessionState, SessionSummary
 from app.services.session_service import create_session, list_sessions, get_session_state, delete_session
-from app.services.event_service import append_text_event
+from app.services.event_service import append_text_event, complete_text_event
 
 router = APIRouter()
 
 
 @router.get("/sessions", response_model=list[SessionSummary])
-def get_sessions() -> list[SessionSummary]:
+@cache_config("/sessions", max_age=30)
+def get_sessions(db: Session = Depends(get_db_ro)) -> list[SessionSummary]:
     """List all sessions."""
-    return list_sessions()
+    return list_sessions(db)
 
 
 @router.post("/sessions", response_model=dict)
-def create_new_session() -> dict:
+@cache_drop("/sessions")
+def create_new_session(db: Session = Depends(get_db_rw)) -> dict:
     """Create a new session and return its session_id."""
-    session_id = create_session()
+    session_id = create_session(db)
     return {"session_id": session_id}
 
 
 @router.delete("/sessions/{session_id}")
-def delete_session_endpoint(session_id: str) -> dict:
+@cache_drop("/sessions", "/session/{session_id}")
+def delete_session_endpoint(session_id: str, db: Session = Depends(get_db_rw)) -> dict:
     """Delete a session and all its events."""
-    deleted = delete_session(session_id)
+    deleted = delete_session(db, session_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Session not found")
     return {"message": "Session deleted successfully"}
 
 
 @router.get("/session/{session_id}", response_model=SessionState)
-def get_session_by_id(session_id: str) -> SessionState:
-    """Get a specific session by ID with all its events."""
-    return get_session_state(session_id)
+@cache_config("/session/{session_id}?surfaces={surfaces}", max_age=10)
+def get_session_by_id(
+    session_id: str,
+    surfaces: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_db_rw),
+) -> SessionState:
+    """Get a specific session by ID with all its events (`?surfaces=` limits which surfaces are built)."""
+    return get_session_state(db, session_id, surfaces)
 
 
 @router.get("/session", response_model=SessionState)
-def get_session(session_id: str = DEFAULT_SESSION_ID) -> SessionState:
+def get_session(
+    session_id: str = DEFAULT_SESSION_ID,
+    surfaces: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_db_rw),
+) -> SessionState:
     """Get a session by query parameter (for backward compatibility)."""
-    return get_session_state(session_id)
+    return get_session_state(db, session_id, surfaces)
+
+
+@cache_drop("/session/")
+def _complete_text_event(event: InputEvent) -> None:
+    complete_text_event(event)
 
 
 @router.post("/events/text", response_model=InputEvent)
-def post_text_event(payload: Dict[str, str]) -> InputEvent:
-    """Append a text event to a session."""
+@cache_drop("/sessions", "/session/")
+def post_text_event(
+    payload: Dict[str, str],
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db_rw),
+) -> InputEvent:
+    """Append a pending text event to a session; the UI update is generated after the response."""
     session_id = payload.get("session_id", DEFAULT_SESSION_ID)
     text = payload.get("text", "")
-    return append_text_event(session_id, text)
+    event = append_text_event(db, session_id, text)
+    background_tasks.add_task(_complete_text_event, event=event)
+    return event
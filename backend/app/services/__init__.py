@@ -1,20 +1,42 @@
-"""Service layer for session and event management."""
-
-from app.services.session_service import create_session, list_sessions, get_session_state, delete_session
-from app.services.event_service import append_text_event
-from app.services.llm_service import (
-    generate_json_response_candidates,
-    get_openai_client,
-    generate_genui_message_candidates,
-)
-
-__all__ = [
-    "create_session",
-    "list_sessions", 
-    "get_session_state",
-    "delete_session",
-    "append_text_event",
-    "generate_json_response_candidates",
-    "generate_genui_message_candidates",
-    "get_openai_client",
-]
+"""Service layer for session and event management.
+
+Attributes are resolved lazily (PEP 562) so importing a single service module
+does not pull in the OpenAI SDK until an LLM helper is actually used.
+"""
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from app.services.session_service import create_session, list_sessions, get_session_state, delete_session
+    from app.services.event_service import append_text_event
+    from app.services.llm_service import (
+        generate_json_response_candidates,
+        get_openai_client,
+        generate_genui_message_candidates,
+    )
+
+_LAZY_ATTRS = {
+    "create_session": "app.services.session_service",
+    "list_sessions": "app.services.session_service",
+    "get_session_state": "app.services.session_service",
+    "delete_session": "app.services.session_service",
+    "append_text_event": "app.services.event_service",
+    "generate_json_response_candidates": "app.services.llm_service",
+    "generate_genui_message_candidates": "app.services.llm_service",
+    "get_openai_client": "app.services.llm_service",
+}
+
+__all__ = list(_LAZY_ATTRS)
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value  # Cache so later lookups skip __getattr__
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -1,21 +1,53 @@
 """Service layer for event management."""
+import logging
 import os
+import threading
 import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
-from typing import List
+from typing import Any, List, Optional, Tuple
+from sqlalchemy import func, literal, or_, update
 from sqlalchemy.orm import Session
 
-from app.database import get_db
+from app.cache import response_cache
+from app.database import session_scope
 from app.models import (
+    FAILED_STATUS,
+    PASSED_STATUS,
+    PENDING_STATUS,
     InputEvent,
     InputEventModel,
+    SessionModel,
+    dump_genui_message_list,
     validate_genui_message_list,
 )
-from app.services.session_service import ensure_session
-from app.services.llm_service import generate_genui_message_candidates
+from app.services.session_service import advance_ui_snapshot, ensure_session
+from app.services.llm_service import generate_genui_message_candidates, hydrate_unsplash_sources
+
+logger = logging.getLogger(__name__)
 
 _PROFILE_EVENTS = os.getenv("GENUI_PROFILE") == "1"
 _MAX_ACCUMULATED_EVENTS = int(os.getenv("GENUI_MAX_ACCUMULATED_EVENTS", "8"))
+# Accumulated text is packed in fixed blocks of seq // K, and the window only
+# ever drops whole blocks from the front, so the packed context keeps a stable
+# prefix (and stays prompt-cacheable) while a block fills up.
+_ACCUMULATED_BLOCK_SIZE = max(1, int(os.getenv("GENUI_ACCUMULATED_BLOCK_SIZE", "4")))
+_MAX_ACCUMULATED_BLOCKS = -(-_MAX_ACCUMULATED_EVENTS // _ACCUMULATED_BLOCK_SIZE)
+
+AccumulatedRows = Tuple[Tuple[int, str], ...]
+
+# session_id -> (seq, recent (seq, text) rows, deltas summary) as of the newest
+# stored event, so steady-state appends extend the previous context instead of
+# re-querying it
+_ACCUMULATED_CACHE: "OrderedDict[str, Tuple[int, AccumulatedRows, str]]" = OrderedDict()
+_ACCUMULATED_CACHE_SIZE = 1024
+_ACCUMULATED_CACHE_LOCK = threading.Lock()
+_CANDIDATE_MAX_WORKERS = 4
+# A pending event older than this is treated as abandoned by a worker that died;
+# keep it well above the slowest LLM call so live generations are never failed
+PENDING_LEASE_SECONDS = float(os.getenv("GENUI_PENDING_LEASE_SECONDS", "600"))
 
 
 def _log_profile(label: str, start: float) -> None:
@@ -24,59 +56,97 @@ def _log_profile(label: str, start: float) -> None:
         print(f"[profile] {label}: {elapsed_ms:.1f}ms")
 
 
-def _sanitize_payload(payload: dict) -> dict:
-    """Remove internal-only fields before returning to clients."""
-    return {
-        key: value
-        for key, value in payload.items()
-        if key != "delta_summary" and not key.startswith("_")
-    }
+def _first_accumulated_seq(last_seq: int) -> int:
+    """Return the first seq of the oldest block kept when `last_seq` is the newest event."""
+    if _MAX_ACCUMULATED_EVENTS <= 0:
+        return 0
+    first_block = last_seq // _ACCUMULATED_BLOCK_SIZE - _MAX_ACCUMULATED_BLOCKS + 1
+    return max(0, first_block) * _ACCUMULATED_BLOCK_SIZE
 
-def get_session_events(session_id: str) -> List[InputEvent]:
-    """Get all events for a session, ordered by sequence."""
-    db = next(get_db())
-    try:
-        event_models = (
-            db.query(InputEventModel)
-            .filter(InputEventModel.session_id == session_id)
-            .order_by(InputEventModel.seq)
-            .all()
+
+def _get_accumulated_texts(db: Session, session_id: str, last_seq: int) -> AccumulatedRows:
+    """Get (seq, text) for the previous events that fall in the kept blocks."""
+    rows = (
+        db.query(InputEventModel.seq, InputEventModel.text)
+        .filter(
+            InputEventModel.session_id == session_id,
+            InputEventModel.seq >= _first_accumulated_seq(last_seq),
+            InputEventModel.seq <= last_seq,
+            InputEventModel.text.isnot(None),
         )
-        
-        return [
-            InputEvent(
-                event_id=event.event_id,
-                session_id=event.session_id,
-                seq=event.seq,
-                payload=event.payload,
-            )
-            for event in event_models
-        ]
-    finally:
-        db.close()
-
-
-def _get_accumulated_text(session_id: str) -> str:
-    """Get all text from previous events in the session."""
-    events = get_session_events(session_id)
-    text_parts = []
-    for event in events:
-        if "text" in event.payload:
-            text_parts.append(event.payload["text"])
-    if _MAX_ACCUMULATED_EVENTS > 0:
-        text_parts = text_parts[-_MAX_ACCUMULATED_EVENTS:]
-    return " ".join(text_parts)
-
-
-def _get_accumulated_deltas_summary(session_id: str) -> str:
-    """Get all prior delta summaries from previous events in the session."""
-    events = get_session_events(session_id)
-    summaries = []
-    for event in events:
-        summary = event.payload.get("_delta_summary")
-        if isinstance(summary, str) and summary.strip():
-            summaries.append(summary.strip())
-    return "\n".join(summaries)
+        .order_by(InputEventModel.seq)
+        .all()
+    )
+    return tuple((row.seq, row.text) for row in rows)
+
+
+def _pack_accumulated_text(rows: AccumulatedRows) -> str:
+    """Pack texts into `[block N]` sections in ascending seq order."""
+    blocks: List[Tuple[int, List[str]]] = []
+    for seq, text in rows:
+        block_id = seq // _ACCUMULATED_BLOCK_SIZE
+        if not blocks or blocks[-1][0] != block_id:
+            blocks.append((block_id, []))
+        blocks[-1][1].append(text)
+    return "".join(f"[block {block_id}]\n{' '.join(texts)}\n" for block_id, texts in blocks)
+
+
+def _get_accumulated_deltas_summary(db: Session, session_id: str, last_seq: int) -> Tuple[str, bool]:
+    """Get prior delta summaries and whether every prior event has finished generating."""
+    deltas_summary = (
+        db.query(SessionModel.deltas_summary_text)
+        .filter(SessionModel.session_id == session_id)
+        .scalar()
+    )
+    pending = (
+        db.query(InputEventModel.event_id)
+        .filter(
+            InputEventModel.session_id == session_id,
+            InputEventModel.seq <= last_seq,
+            InputEventModel.validation_status == PENDING_STATUS,
+        )
+        .exists()
+    )
+    return deltas_summary or "", not db.query(pending).scalar()
+
+
+def _get_accumulated_state(db: Session, session_id: str, seq: int) -> Tuple[AccumulatedRows, str, bool]:
+    """
+    Return (recent rows, deltas summary, cacheable) for the events before `seq`.
+
+    The result is only cacheable when every earlier event has finished
+    generating; an earlier event that is still pending would otherwise be
+    missing its delta summary from the cached context for good.
+    """
+    with _ACCUMULATED_CACHE_LOCK:
+        cached = _ACCUMULATED_CACHE.get(session_id)
+    if cached is not None and cached[0] == seq - 1:
+        return cached[1], cached[2], True
+    rows = _get_accumulated_texts(db, session_id, seq - 1)
+    deltas_summary, settled = _get_accumulated_deltas_summary(db, session_id, seq - 1)
+    return rows, deltas_summary, settled
+
+
+def _remember_accumulated_state(
+    session_id: str,
+    seq: int,
+    rows: AccumulatedRows,
+    deltas_summary: str,
+) -> None:
+    first_seq = _first_accumulated_seq(seq)
+    if rows and rows[0][0] < first_seq:
+        rows = tuple(row for row in rows if row[0] >= first_seq)
+    with _ACCUMULATED_CACHE_LOCK:
+        _ACCUMULATED_CACHE[session_id] = (seq, rows, deltas_summary)
+        _ACCUMULATED_CACHE.move_to_end(session_id)
+        if len(_ACCUMULATED_CACHE) > _ACCUMULATED_CACHE_SIZE:
+            _ACCUMULATED_CACHE.popitem(last=False)
+
+
+def forget_accumulated_state(session_id: str) -> None:
+    """Drop the cached context of a deleted session so a recreated one starts clean."""
+    with _ACCUMULATED_CACHE_LOCK:
+        _ACCUMULATED_CACHE.pop(session_id, None)
 
 
 def _extract_messages_for_client(llm_response: object) -> object:
@@ -95,117 +165,274 @@ def _extract_messages_for_client(llm_response: object) -> object:
     return llm_response
 
 
-def append_text_event(session_id: str, text: str) -> InputEvent:
+def _check_candidate(idx: int, candidate: Any) -> Tuple[List[dict], Optional[str]]:
+    """Hydrate and validate one LLM candidate; raises ValueError (or TypeError) if it fails the schema."""
+    hydrate_unsplash_sources(candidate)
+    messages = (
+        candidate.get("messages", [])
+        if isinstance(candidate, dict)
+        else candidate
+    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("LLM candidate %d: %s", idx + 1, candidate)
+    validated_messages = validate_genui_message_list(messages)
+    # Convert validated models to the JSON-ready message list stored and served as-is
+    llm_response = dump_genui_message_list(validated_messages, mode="json")
+    delta_summary = None
+    if isinstance(candidate, dict):
+        summary = candidate.get("summary")
+        if isinstance(summary, str) and summary.strip():
+            delta_summary = summary.strip()
+    return llm_response, delta_summary
+
+
+def _select_candidate(candidates: List[Any]) -> Tuple[int, List[dict], Optional[str]]:
+    """
+    Hydrate and validate candidates concurrently and return the first one, in
+    candidate order, that passes: (index, validated messages, delta summary).
+
+    Raises:
+        ValueError: If no candidate passes validation
+    """
+    if not candidates:
+        raise ValueError("No valid GenUI response candidates returned.")
+    if len(candidates) == 1:
+        try:
+            return (0, *_check_candidate(0, candidates[0]))
+        except TypeError as te:
+            raise ValueError(str(te)) from te
+
+    pool = ThreadPoolExecutor(max_workers=min(_CANDIDATE_MAX_WORKERS, len(candidates)))
+    try:
+        futures = [pool.submit(_check_candidate, idx, candidate) for idx, candidate in enumerate(candidates)]
+        last_validation_error = None
+        for idx, future in enumerate(futures):
+            try:
+                return (idx, *future.result())
+            except (ValueError, TypeError) as ve:
+                # A malformed candidate only rules itself out
+                last_validation_error = str(ve)
+        raise ValueError(last_validation_error)
+    finally:
+        # Candidates still queued behind the winner are no longer needed
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def append_text_event(db: Session, session_id: str, text: str) -> InputEvent:
+    """
+    Append a pending text event to the database and return it immediately.
+
+    The seq bump and the insert share one commit, so the write connection is
+    released before any LLM work starts. Call `complete_text_event` with the
+    returned event (e.g. as a background task) to generate and store the
+    GenUI response.
+    """
+    overall_start = time.perf_counter()
+    ensure_start = time.perf_counter()
+    session = ensure_session(db, session_id)
+    session.seq_counter += 1
+    _log_profile("event.ensure_session", ensure_start)
+
+    payload = {"text": text, "validation_status": PENDING_STATUS}
+    event = InputEvent(
+        event_id=uuid4().hex,
+        session_id=session_id,
+        seq=session.seq_counter,
+        payload=payload,
+    )
+
+    # Save to database
+    save_start = time.perf_counter()
+    db.add(InputEventModel(
+        event_id=event.event_id,
+        session_id=event.session_id,
+        seq=event.seq,
+        payload=payload,
+    ))
+    db.commit()
+    _log_profile("event.db_commit", save_start)
+    _log_profile("event.append_total", overall_start)
+    return event
+
+
+def complete_text_event(event: InputEvent) -> None:
     """
-    Append a text event to the database and generate GenUI JSON via LLM.
+    Generate GenUI JSON via LLM for a pending text event and store the result.
     
     The LLM response is stored in the event payload under 'llm_response'.
+    No database connection is held while the LLM request is in flight. Any
+    error settles the event as failed, so it never stays pending.
     """
-    overall_start = time.perf_counter()
-    db = next(get_db())
     try:
-        ensure_start = time.perf_counter()
-        session = ensure_session(db, session_id)
-        session.seq_counter += 1
+        _generate_and_store_event(event)
+    except Exception as e:
+        logger.exception("Completing event seq %d of session %s failed", event.seq, event.session_id)
+        _store_failed_event(event, f"Event completion failed: {e}")
+
+
+def _settle_pending_event(db: Session, event_id: str, payload: dict) -> bool:
+    """
+    Store a final payload only if the event is still pending; returns whether it was.
+
+    Several workers can race to settle the same event (a late completion, a
+    stale sweep), so the pending check and the write are one UPDATE.
+    """
+    result = db.execute(
+        update(InputEventModel)
+        .where(
+            InputEventModel.event_id == event_id,
+            InputEventModel.validation_status == PENDING_STATUS,
+        )
+        .values(payload=payload)
+    )
+    return result.rowcount > 0
+
+
+def _store_failed_event(event: InputEvent, error: str) -> None:
+    """Settle a still-pending event as failed and let the UI snapshot move past it."""
+    try:
+        with session_scope() as db:
+            settled = _settle_pending_event(db, event.event_id, {
+                "text": event.payload.get("text", ""),
+                "validation_status": FAILED_STATUS,
+                "validation_error": error,
+            })
+            db.commit()
+            if settled:
+                advance_ui_snapshot(db, event.session_id)
+    except Exception:
+        logger.exception("Could not mark event seq %d of session %s as failed", event.seq, event.session_id)
+
+
+def fail_pending_events(lease_seconds: float = PENDING_LEASE_SECONDS) -> int:
+    """
+    Mark events pending for longer than `lease_seconds` as failed; returns how many.
+
+    Generation runs as an in-process background task, so an event still
+    pending past the lease belongs to a task that died with its worker.
+    Younger pending events may be in flight on another worker and are left
+    alone. Rows from before created_at existed count as stale.
+    """
+    cutoff = time.time() - lease_seconds
+    with session_scope() as db:
+        stale_sessions = db.execute(
+            update(InputEventModel)
+            .where(
+                # Literal so SQLite can pick the partial index on pending rows
+                InputEventModel.validation_status == literal(PENDING_STATUS, literal_execute=True),
+                or_(InputEventModel.created_at.is_(None), InputEventModel.created_at < cutoff),
+            )
+            .values(payload=func.json_set(
+                InputEventModel.payload,
+                "$.validation_status", FAILED_STATUS,
+                "$.validation_error", "Generation did not finish before its lease expired",
+            ))
+            .returning(InputEventModel.session_id)
+        ).scalars().all()
         db.commit()
-        db.refresh(session)
-        _log_profile("event.ensure_session", ensure_start)
-        
-        # Get accumulated text and summaries from previous events
-        accum_start = time.perf_counter()
-        accumulated_text = _get_accumulated_text(session_id)
-        deltas_summary = _get_accumulated_deltas_summary(session_id)
-        _log_profile("event.accumulated_state", accum_start)
+        for session_id in set(stale_sessions):
+            advance_ui_snapshot(db, session_id)
+    if stale_sessions:
+        # The periodic sweep runs outside any request, so no route drops these for it
+        response_cache.drop("/session/")
+    return len(stale_sessions)
+
+
+def _generate_and_store_event(event: InputEvent) -> None:
+    overall_start = time.perf_counter()
+    session_id = event.session_id
+    text = event.payload.get("text", "")
+
+    # Get accumulated text and summaries from previous events
+    accum_start = time.perf_counter()
+    with session_scope(readonly=True) as db:
+        prior_rows, deltas_summary, cacheable = _get_accumulated_state(db, session_id, event.seq)
+    accumulated_text = _pack_accumulated_text(prior_rows)
+    _log_profile("event.accumulated_state", accum_start)
+    if _PROFILE_EVENTS:
+        print(f"[profile] event.pack_version: {zlib.crc32(accumulated_text.encode()):08x}")
+    
+    # Generate GenUI JSON from LLM
+    llm_response = None
+    validation_error = None
+    delta_summary = None
+    try:
+        llm_start = time.perf_counter()
+        llm_response_candidates = generate_genui_message_candidates(
+            accumulated_text=accumulated_text,
+            current_text=text,
+            deltas_summary=deltas_summary,
+            hydrate=False,
+        )
+        _log_profile("event.llm_generate", llm_start)
         
-        # Generate GenUI JSON from LLM
-        llm_response = None
-        validation_error = None
-        delta_summary = None
+        # Hydrate and validate against GenUI schema using Pydantic models
+        validation_start = time.perf_counter()
         try:
-            llm_start = time.perf_counter()
-            llm_response_candidates = generate_genui_message_candidates(
-                accumulated_text=accumulated_text,
-                current_text=text,
-                deltas_summary=deltas_summary,
+            candidate_idx, llm_response, delta_summary = _select_candidate(llm_response_candidates)
+            logger.info(
+                "GenUI validation passed for event seq %d using candidate %d",
+                event.seq,
+                candidate_idx + 1,
             )
-            _log_profile("event.llm_generate", llm_start)
-            
-            # Validate against GenUI schema using Pydantic models
-            validation_start = time.perf_counter()
-            last_validation_error = None
-            for idx, candidate in enumerate(llm_response_candidates):
-                try:
-                    messages = (
-                        candidate.get("messages", [])
-                        if isinstance(candidate, dict)
-                        else candidate
-                    )
-                    print(f"LLM candidate {idx + 1}: {candidate}")
-                    validated_messages = validate_genui_message_list(messages)
-                    # Convert validated models back to dicts for storage
-                    llm_response = [
-                        message.model_dump() for message in validated_messages
-                    ]
-                    if isinstance(candidate, dict):
-                        summary = candidate.get("summary")
-                        if isinstance(summary, str) and summary.strip():
-                            delta_summary = summary.strip()
-                    print(
-                        f"✓ GenUI validation passed for event seq {session.seq_counter} "
-                        f"using candidate {idx + 1}"
+        except ValueError as ve:
+            # Validation failed - store responses for debugging
+            validation_error = str(ve)
+            llm_response = llm_response_candidates  # Store raw responses for debugging
+            logger.warning("GenUI validation failed for event seq %d: %s", event.seq, validation_error)
+        _log_profile("event.validation", validation_start)
+    except Exception as e:
+        # If LLM call fails, log error but still settle the event
+        validation_error = f"LLM generation failed: {str(e)}"
+        logger.warning("LLM generation failed: %s", e)
+    
+    # Create event payload with text, LLM response, and validation status
+    payload = {"text": text}
+    if validation_error is None:
+        payload["llm_response"] = llm_response
+    elif llm_response:
+        # Raw candidates kept for debugging still need reshaping for clients
+        payload["llm_response"] = _extract_messages_for_client(llm_response)
+    if delta_summary:
+        payload["_delta_summary"] = delta_summary
+    if validation_error:
+        payload["validation_error"] = validation_error
+        payload["validation_status"] = FAILED_STATUS
+    else:
+        payload["validation_status"] = PASSED_STATUS
+    
+    # Save to database, unless the event was settled (by a stale sweep) or deleted meanwhile
+    save_start = time.perf_counter()
+    with session_scope() as db:
+        settled = _settle_pending_event(db, event.event_id, payload)
+        if settled:
+            if delta_summary:
+                # Append in SQL so concurrent completions cannot drop each other's summary
+                db.execute(
+                    update(SessionModel)
+                    .where(SessionModel.session_id == session_id)
+                    .values(
+                        deltas_summary_text=func.coalesce(SessionModel.deltas_summary_text + "\n", "")
+                        + delta_summary
                     )
-                    last_validation_error = None
-                    break
-                except ValueError as ve:
-                    last_validation_error = str(ve)
-                    continue
-            _log_profile("event.validation", validation_start)
-            
-            if llm_response is None:
-                # Validation failed - store responses for debugging
-                validation_error = last_validation_error or "No valid GenUI response candidates returned."
-                llm_response = llm_response_candidates  # Store raw responses for debugging
-                print(f"⚠ GenUI validation failed for event seq {session.seq_counter}: {validation_error}")
-        except Exception as e:
-            # If LLM call fails, log error but don't fail the event creation
-            validation_error = f"LLM generation failed: {str(e)}"
-            print(f"Warning: LLM generation failed: {e}")
-        
-        # Create event payload with text, LLM response, and validation status
-        payload = {"text": text}
-        if llm_response:
-            payload["llm_response"] = _extract_messages_for_client(llm_response)
+                )
+            db.commit()
+            advance_ui_snapshot(db, session_id)
+    _log_profile("event.db_commit", save_start)
+    _log_profile("event.complete_total", overall_start)
+    if not settled:
+        logger.info("Dropping result for event seq %d of session %s: no longer pending", event.seq, session_id)
+        return
+
+    if cacheable:
         if delta_summary:
-            payload["_delta_summary"] = delta_summary
-        if validation_error:
-            payload["validation_error"] = validation_error
-            payload["validation_status"] = "failed"
-        else:
-            payload["validation_status"] = "passed"
-        
-        event = InputEvent(
-            event_id=str(uuid4()),
-            session_id=session_id,
-            seq=session.seq_counter,
-            payload=_sanitize_payload(payload),
-        )
-        
-        # Save to database
-        save_start = time.perf_counter()
-        event_model = InputEventModel(
-            event_id=event.event_id,
-            session_id=event.session_id,
-            seq=event.seq,
-            payload=payload,
-        )
-        db.add(event_model)
-        db.commit()
-        _log_profile("event.db_commit", save_start)
-        
-        return event
-    finally:
-        db.close()
-        _log_profile("event.total", overall_start)
+            deltas_summary = f"{deltas_summary}\n{delta_summary}" if deltas_summary else delta_summary
+        _remember_accumulated_state(session_id, event.seq, prior_rows + ((event.seq, text),), deltas_summary)
 
 
-__all__ = ["append_text_event", "get_session_events"]
+__all__ = [
+    "append_text_event",
+    "complete_text_event",
+    "fail_pending_events",
+    "forget_accumulated_state",
+]
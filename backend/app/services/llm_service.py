@@ -1,9 +1,14 @@
 """Service layer for LLM integration (OpenAI GPT-4o)."""
-import json
+import logging
 import os
 import re
+import threading
 import time
-from typing import Any, Dict, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Dict, Iterable, List, Optional, Set
+import httpx
+import orjson
+from cachetools import TTLCache
 from openai import OpenAI
 from openai import OpenAIError
 
@@ -17,12 +22,20 @@ except ImportError:  # pragma: no cover
         """Fallback TokenC error when tokenc is unavailable."""
         pass
 
-from app.prompts import GENUI_SYSTEM_PROMPT, get_genui_user_prompt
+from app.prompts import GENUI_SYSTEM_PROMPT, get_genui_context_prompt, get_genui_user_prompt
 from app.services.unsplash import search_unsplash
 
 code_block_pattern = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
 
+logger = logging.getLogger(__name__)
+
 _PROFILE_LLM = os.getenv("GENUI_PROFILE") == "1"
+_UNSPLASH_MAX_WORKERS = 8
+
+# Lowercased query -> resolved URL (None when Unsplash had no match)
+_UNSPLASH_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
+_UNSPLASH_CACHE_LOCK = threading.Lock()
+_UNSPLASH_MISSING = object()
 
 
 def _log_profile(label: str, start: float) -> None:
@@ -31,11 +44,20 @@ def _log_profile(label: str, start: float) -> None:
         print(f"[profile] {label}: {elapsed_ms:.1f}ms")
 
 def _parse_json_payload(content: str) -> Any:
+    """Extract JSON even when wrapped in Markdown code fences."""
     stripped = content.strip()
     match = code_block_pattern.search(stripped)
     if match:
         stripped = match.group(1).strip()
-    return json.loads(stripped)
+    return orjson.loads(stripped)
+
+# Built once so every GenUI request sends the same system message object
+_SYSTEM_MESSAGE: Dict[str, str] = {"role": "system", "content": GENUI_SYSTEM_PROMPT}
+
+# Upstream connection pool: keep TLS connections alive and multiplex over HTTP/2
+_OPENAI_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+_OPENAI_HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
 # Initialize OpenAI client (lazy initialization)
 _client: Optional[OpenAI] = None
 _tokenc_client: Optional["TokenClient"] = None
@@ -51,7 +73,14 @@ def get_openai_client() -> OpenAI:
                 "OPENAI_API_KEY environment variable is not set. "
                 "Please set it in your .env file."
             )
-        _client = OpenAI(api_key=api_key)
+        _client = OpenAI(
+            api_key=api_key,
+            http_client=httpx.Client(
+                http2=True,
+                limits=_OPENAI_HTTP_LIMITS,
+                timeout=_OPENAI_HTTP_TIMEOUT,
+            ),
+        )
     return _client
 
 
@@ -69,34 +98,39 @@ def get_tokenc_client() -> Optional["TokenClient"]:
         _tokenc_client = TokenClient(api_key=api_key)
         return _tokenc_client
     except Exception as exc:  # pragma: no cover - defensive
-        print(f"Warning: Failed to initialize TokenC client: {exc}")
+        logger.warning("Failed to initialize TokenC client: %s", exc)
         return None
 
 
+def _read_tokenc_aggressiveness() -> float:
+    try:
+        aggressiveness = float(os.getenv("TOKENC_AGGRESSIVENESS", "0.4"))
+    except ValueError:
+        aggressiveness = 0.4
+    return max(0.1, min(0.9, aggressiveness))
+
+
+_TOKENC_AGGRESSIVENESS = _read_tokenc_aggressiveness()
+
+
 def compress_user_prompt(prompt: str) -> str:
     """Compress user prompt via TokenC to reduce tokens if enabled."""
     client = get_tokenc_client()
     if not client:
         return prompt
 
-    aggressiveness_value = os.getenv("TOKENC_AGGRESSIVENESS", "0.4")
-    try:
-        aggressiveness = float(aggressiveness_value)
-    except ValueError:
-        aggressiveness = 0.4
-
     try:
         response = client.compress_input(
             input=prompt,
-            aggressiveness=max(0.1, min(0.9, aggressiveness)),
+            aggressiveness=_TOKENC_AGGRESSIVENESS,
         )
         compressed = response.output.strip()
         if compressed:
             return compressed
     except TokenCError as exc:
-        print(f"Warning: TokenC compression failed: {exc}")
+        logger.warning("TokenC compression failed: %s", exc)
     except Exception as exc:  # pragma: no cover - defensive
-        print(f"Warning: Unexpected TokenC compression error: {exc}")
+        logger.warning("Unexpected TokenC compression error: %s", exc)
 
     return prompt
 
@@ -108,6 +142,18 @@ def _resolve_unsplash_url(value: str) -> str | None:
     query = normalized.split(":", 1)[1].strip()
     if not query:
         return None
+    cache_key = query.lower()
+    with _UNSPLASH_CACHE_LOCK:
+        cached = _UNSPLASH_CACHE.get(cache_key, _UNSPLASH_MISSING)
+    if cached is not _UNSPLASH_MISSING:
+        return cached
+    url = _fetch_unsplash_url(query)
+    with _UNSPLASH_CACHE_LOCK:
+        _UNSPLASH_CACHE[cache_key] = url
+    return url
+
+
+def _fetch_unsplash_url(query: str) -> str | None:
     def _fetch(query_text: str) -> List[Dict[str, Any]]:
         fetch_start = time.perf_counter()
         results = search_unsplash(query=query_text, per_page=1)
@@ -146,30 +192,115 @@ def _is_unsplash_placeholder(value: str) -> bool:
     return value.strip().lower().startswith("unsplash:")
 
 
-def _hydrate_unsplash_sources(payload: Any) -> None:
-    """Replace unsplash:<query> placeholders with real Unsplash image URLs."""
-    messages = payload
-    if isinstance(payload, dict):
-        messages = payload.get("messages", [])
+def _component_placeholder(props: Dict[str, Any]) -> str | None:
+    """Return the unsplash placeholder an Image/Icon component would be hydrated from."""
+    source = props.get("source")
+    if isinstance(source, dict):
+        candidate_url = source.get("url")
+        if isinstance(candidate_url, str) and _is_unsplash_placeholder(candidate_url):
+            return candidate_url
+    elif isinstance(source, str) and _is_unsplash_placeholder(source):
+        return source
+    candidate_url_field = props.get("url")
+    if isinstance(candidate_url_field, str) and _is_unsplash_placeholder(candidate_url_field):
+        return candidate_url_field
+    return None
 
-    def _walk(value: Any) -> Any:
+
+def _collect_unsplash_placeholders(messages: Iterable[Any]) -> Set[str]:
+    """Collect every distinct placeholder that hydration would try to resolve."""
+    found: Set[str] = set()
+
+    def _walk(value: Any) -> None:
         if isinstance(value, dict):
-            for key, item in list(value.items()):
-                value[key] = _walk(item)
-            return value
-        if isinstance(value, list):
-            return [_walk(item) for item in value]
-        if isinstance(value, str):
-            if _is_unsplash_placeholder(value):
-                resolved = _resolve_unsplash_url(value)
-                return resolved if resolved else None
-            return value
-        return value
+            for item in value.values():
+                _walk(item)
+        elif isinstance(value, list):
+            for item in value:
+                _walk(item)
+        elif isinstance(value, str) and _is_unsplash_placeholder(value):
+            found.add(value)
 
     for message in messages:
         if not isinstance(message, dict):
             continue
+        if message.get("type") == "surfaceUpdate":
+            components = message.get("components")
+            if not isinstance(components, list):
+                continue
+            for component in components:
+                if not isinstance(component, dict):
+                    continue
+                comp_def = component.get("component")
+                if not isinstance(comp_def, dict):
+                    continue
+                for key in ("Image", "Icon"):
+                    props = comp_def.get(key)
+                    if isinstance(props, dict):
+                        placeholder = _component_placeholder(props)
+                        if placeholder is not None:
+                            found.add(placeholder)
+        elif message.get("type") == "dataModelUpdate":
+            data = message.get("data")
+            if isinstance(data, dict):
+                _walk(data)
+    return found
+
+
+def _resolve_unsplash_urls(placeholders: Set[str]) -> Dict[str, str | None]:
+    """Resolve placeholders concurrently; each distinct query is fetched once."""
+    unique = list(placeholders)
+    if len(unique) <= 1:
+        return {value: _resolve_unsplash_url(value) for value in unique}
+    with ThreadPoolExecutor(max_workers=min(_UNSPLASH_MAX_WORKERS, len(unique))) as pool:
+        return dict(zip(unique, pool.map(_resolve_unsplash_url, unique)))
 
+
+def _has_unsplash_placeholder(message: Dict[str, Any]) -> bool:
+    """Cheap pre-scan: one serialization instead of walking a tree with nothing to hydrate."""
+    try:
+        return b"unsplash:" in orjson.dumps(message).lower()
+    except TypeError:
+        # orjson rejects non-str keys, ints past 64 bits, etc.; let the full walk decide
+        return True
+
+
+def _substitute_placeholders(value: Any, resolved_urls: Dict[str, str | None]) -> None:
+    """Replace placeholder strings inside nested dicts/lists in place."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, str):
+                if _is_unsplash_placeholder(item):
+                    value[key] = resolved_urls.get(item) or None
+            elif isinstance(item, (dict, list)):
+                _substitute_placeholders(item, resolved_urls)
+    elif isinstance(value, list):
+        for idx, item in enumerate(value):
+            if isinstance(item, str):
+                if _is_unsplash_placeholder(item):
+                    value[idx] = resolved_urls.get(item) or None
+            elif isinstance(item, (dict, list)):
+                _substitute_placeholders(item, resolved_urls)
+
+
+def hydrate_unsplash_sources(payload: Any) -> None:
+    """Replace unsplash:<query> placeholders with real Unsplash image URLs."""
+    messages = payload
+    if isinstance(payload, dict):
+        messages = payload.get("messages", [])
+    if not isinstance(messages, list):
+        return
+
+    messages = [
+        message
+        for message in messages
+        if isinstance(message, dict) and _has_unsplash_placeholder(message)
+    ]
+    if not messages:
+        return
+    resolved_urls = _resolve_unsplash_urls(_collect_unsplash_placeholders(messages))
+
+    for message in messages:
         if message.get("type") == "surfaceUpdate":
             components = message.get("components")
             if not isinstance(components, list):
@@ -190,35 +321,18 @@ def _hydrate_unsplash_sources(payload: Any) -> None:
                     props = comp_def.get(key)
                     if not isinstance(props, dict):
                         continue
-                    source = props.get("source")
-                    url_value = None
-                    url_target = None
-
-                    if isinstance(source, dict):
-                        candidate_url = source.get("url")
-                        if isinstance(candidate_url, str) and _is_unsplash_placeholder(candidate_url):
-                            url_value = candidate_url
-                            url_target = ("source", source)
-                    elif isinstance(source, str) and _is_unsplash_placeholder(source):
-                        url_value = source
-                        url_target = ("source", props)
-
-                    candidate_url_field = props.get("url")
-                    if url_value is None and isinstance(candidate_url_field, str) and _is_unsplash_placeholder(candidate_url_field):
-                        url_value = candidate_url_field
-                        url_target = ("url", props)
-
+                    url_value = _component_placeholder(props)
                     if url_value is None:
                         continue
 
-                    resolved = _resolve_unsplash_url(url_value)
+                    resolved = resolved_urls.get(url_value)
                     if resolved:
-                        if url_target and url_target[0] == "source":
-                            if url_target[1] is props:
-                                props["source"] = resolved
-                            else:
-                                url_target[1]["url"] = resolved
-                        elif url_target and url_target[0] == "url":
+                        source = props.get("source")
+                        if isinstance(source, dict) and source.get("url") == url_value:
+                            source["url"] = resolved
+                        elif source == url_value:
+                            props["source"] = resolved
+                        else:
                             props["url"] = resolved
                     else:
                         removed = True
@@ -233,30 +347,35 @@ def _hydrate_unsplash_sources(payload: Any) -> None:
         if message.get("type") == "dataModelUpdate":
             data = message.get("data")
             if isinstance(data, dict):
-                message["data"] = _walk(data)
+                _substitute_placeholders(data, resolved_urls)
 
 def generate_json_with_unsplash(
     text: str,
     system_prompt: str,
     user_prompt: str,
+    context_prompt: Optional[str] = None,
     model: str = "gpt-4o",
     temperature: float = 0.7,
     max_tokens: int = 2000,
+    hydrate: bool = True,
 ) -> List[Any]:
     llm_start = time.perf_counter()
     json_candidates = generate_json_response_candidates(
         text=text,
         system_prompt=system_prompt,
         user_prompt=user_prompt,
+        context_prompt=context_prompt,
         model=model,
         temperature=temperature,
         max_tokens=max_tokens,
     )
     _log_profile("llm.generate_candidates", llm_start)
+    if not hydrate:
+        return json_candidates
 
     hydrate_start = time.perf_counter()
     for candidate in json_candidates:
-        _hydrate_unsplash_sources(candidate)
+        hydrate_unsplash_sources(candidate)
     _log_profile("llm.hydrate_unsplash", hydrate_start)
 
     return json_candidates
@@ -265,9 +384,11 @@ def generate_json_response_candidates(
     text: str,
     system_prompt: str,
     user_prompt: Optional[str] = None,
+    context_prompt: Optional[str] = None,
     model: str = "gpt-4o",
     temperature: float = 0.7,
     max_tokens: int = 2000,
+    n: int = 1,
 ) -> List[Any]:
     """
     Generate JSON candidates from text using OpenAI GPT-4o.
@@ -281,9 +402,14 @@ def generate_json_response_candidates(
         system_prompt: System prompt that defines the task and expected JSON format
         user_prompt: Optional user prompt template. If None, uses default template.
             Use {text} placeholder to inject the text.
+        context_prompt: Optional context sent as its own user message between the
+            system prompt and the user prompt. It is passed through verbatim (no
+            compression) so the system + context prefix stays byte-identical
+            across calls and can hit the provider's prompt cache.
         model: OpenAI model to use (default: gpt-4o)
         temperature: Sampling temperature (0.0 to 2.0)
         max_tokens: Maximum tokens in response
+        n: Number of completion choices to request
         
     Returns:
         List of parsed JSON payloads (one per completion choice)
@@ -312,42 +438,51 @@ def generate_json_response_candidates(
             raise ValueError("Response JSON object must include a 'messages' array.")
         raise ValueError("Response JSON must be either an array or an object with 'messages'.")
     
-    code_block_pattern = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
-    
-    def _parse_json_payload(content: str) -> Any:
-        """Extract JSON even when wrapped in Markdown code fences."""
-        stripped = content.strip()
-        match = code_block_pattern.search(stripped)
-        if match:
-            stripped = match.group(1).strip()
-        return json.loads(stripped)
-    
     try:
         request_start = time.perf_counter()
-        response = client.chat.completions.create(
+        messages = [
+            _SYSTEM_MESSAGE
+            if system_prompt == GENUI_SYSTEM_PROMPT
+            else {"role": "system", "content": system_prompt}
+        ]
+        if context_prompt:
+            messages.append({"role": "user", "content": context_prompt})
+        messages.append({"role": "user", "content": formatted_user_prompt})
+        # Stream the completion and stop reading once every requested choice has finished
+        buffers: Dict[int, List[str]] = {}
+        finished: Set[int] = set()
+        with client.chat.completions.create(
             model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": formatted_user_prompt},
-            ],
+            messages=messages,
             temperature=temperature,
             max_tokens=max_tokens,
-        )
+            n=n,
+            stream=True,
+        ) as stream:
+            first_chunk = True
+            for chunk in stream:
+                if first_chunk:
+                    _log_profile("llm.openai_first_chunk", request_start)
+                    first_chunk = False
+                for choice in chunk.choices:
+                    content = choice.delta.content
+                    if content:
+                        buffers.setdefault(choice.index, []).append(content)
+                    if choice.finish_reason is not None:
+                        finished.add(choice.index)
+                if len(finished) >= n:
+                    break
         _log_profile("llm.openai_request", request_start)
         
         # Extract and parse each JSON content from the response
         json_candidates: List[Any] = []
         parse_errors: List[str] = []
         parse_start = time.perf_counter()
-        for idx, choice in enumerate(response.choices):
-            content = choice.message.content
-            if not content:
-                parse_errors.append(f"Choice {idx} returned empty content.")
-                continue
+        for idx in sorted(buffers):
             try:
-                parsed_payload = _parse_json_payload(content)
+                parsed_payload = _parse_json_payload("".join(buffers[idx]))
                 json_candidates.append(_extract_payload(parsed_payload))
-            except (json.JSONDecodeError, ValueError) as exc:
+            except (orjson.JSONDecodeError, ValueError) as exc:
                 parse_errors.append(f"Choice {idx} invalid JSON: {exc}")
         
         if json_candidates:
@@ -385,6 +520,7 @@ def generate_genui_message_candidates(
     model: str = "gpt-4o",
     temperature: float = 0.7,
     max_tokens: int = 2000,
+    hydrate: bool = True,
 ) -> List[Any]:
     """
     Generate GenUI schema JSON from accumulated and current text.
@@ -396,39 +532,40 @@ def generate_genui_message_candidates(
         model: OpenAI model to use (default: gpt-4o)
         temperature: Sampling temperature (0.0 to 2.0)
         max_tokens: Maximum tokens in response
+        hydrate: Resolve unsplash placeholders before returning. Callers that
+            hydrate candidates themselves (e.g. alongside validation) pass False.
         
     Returns:
         List of parsed JSON payloads generated by the LLM (one per completion choice)
     """
     system_prompt = get_genui_system_prompt()
     
-    # Combine accumulated and current text
-    full_text = accumulated_text.strip()
-    if full_text:
-        full_text += " " + current_text.strip()
-    else:
-        full_text = current_text.strip()
+    # Stable prefix (system + accumulated context) first, per-event input last
+    context_prompt = get_genui_context_prompt(accumulated_text.strip())
+    current_text = current_text.strip()
     
     # Get user prompt from prompts module
-    user_prompt = get_genui_user_prompt(
-        accumulated_text,
-        current_text,
-        deltas_summary=deltas_summary,
-    )
-    print("LLM context:")
-    print(f"- accumulated_text: {accumulated_text!r}")
-    print(f"- deltas_summary: {deltas_summary!r}")
-    print(f"- current_text: {current_text!r}")
-    print(f"- full_text: {full_text!r}")
-    print(f"- user_prompt: {user_prompt}")
+    user_prompt = get_genui_user_prompt(deltas_summary=deltas_summary)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "LLM context:\n- accumulated_text: %r\n- deltas_summary: %r\n"
+            "- current_text: %r\n- context_prompt: %s\n- user_prompt: %s",
+            accumulated_text,
+            deltas_summary,
+            current_text,
+            context_prompt,
+            user_prompt,
+        )
     
     return generate_json_with_unsplash(
-        text=full_text,
+        text=current_text,
         system_prompt=system_prompt,
-        user_prompt=compress_user_prompt(user_prompt),
+        user_prompt=user_prompt,
+        context_prompt=context_prompt,
         model=model,
         temperature=temperature,
         max_tokens=max_tokens,
+        hydrate=hydrate,
     )
 
 
@@ -438,4 +575,5 @@ __all__ = [
     "get_openai_client",
     "generate_genui_message_candidates",
     "get_genui_system_prompt",
+    "hydrate_unsplash_sources",
 ]
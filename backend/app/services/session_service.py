@@ -1,11 +1,16 @@
 """Service layer for session management (CRUD operations)."""
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from uuid import uuid4
-from typing import Any, Dict, List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session, selectinload
 
-from app.database import get_db
+from app.cache import response_cache
+from app.database import RAISELOAD_GUARD
 from app.models import (
+    PASSED_STATUS,
+    PENDING_STATUS,
     SessionModel,
     InputEventModel,
     SessionState,
@@ -15,6 +20,15 @@ from app.models import (
     InputEvent,
 )
 
+# session_id -> (events version, replayed surfaces, component trees built so far).
+# Events only move one way (appended as pending, then settled once), so
+# (last seq, settled count) identifies the replay inputs without hashing the
+# payloads. Trees are built per surface on first request and kept for the version.
+_UI_CACHE: "OrderedDict[str, Tuple[Tuple[int, int], Dict[str, Dict[str, Any]], Dict[str, List[ComponentNode]]]]" = OrderedDict()
+_UI_CACHE_SIZE = 256
+_UI_CACHE_LOCK = threading.Lock()
+_SNAPSHOT_ATTEMPTS = 3
+
 
 def get_session(db: Session, session_id: str) -> SessionModel | None:
     """Get a session by ID."""
@@ -32,20 +46,44 @@ def ensure_session(db: Session, session_id: str) -> SessionModel:
     return session
 
 
-def _extract_surface_updates(events: List[InputEvent]) -> Dict[str, Dict[str, Any]]:
+def _new_surface_state() -> Dict[str, Any]:
+    """Empty replay state for _apply_surface_events (JSON-serializable for snapshots)."""
+    return {
+        "surfaces": {},
+        "pending": {},
+        "pending_data": {},
+        "rendered": [],
+        "data_model": None,
+    }
+
+
+def _copy_surface_state(state: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Copy the containers of a stored state so replaying onto it leaves the original intact."""
+    if not state:
+        return _new_surface_state()
+    return {
+        "surfaces": dict(state.get("surfaces") or {}),
+        "pending": dict(state.get("pending") or {}),
+        "pending_data": dict(state.get("pending_data") or {}),
+        "rendered": list(state.get("rendered") or []),
+        "data_model": state.get("data_model"),
+    }
+
+
+def _apply_surface_events(state: Dict[str, Any], payloads: Iterable[Optional[Dict[str, Any]]]) -> None:
     """
-    Return latest surfaceUpdate and associated data per surface name, only after
-    a beginRendering message confirms the surface is ready.
+    Fold event payloads (in seq order) into the replay state. A surfaceUpdate is
+    rendered once a beginRendering message confirms the surface is ready.
     """
-    surfaces: Dict[str, Dict[str, Any]] = {}
-    pending: Dict[str, Dict[str, Any]] = {}
-    pending_data: Dict[str, Optional[Dict[str, Any]]] = {}
-    rendered_surfaces: set[str] = set()
-    current_data_model: Optional[Dict[str, Any]] = None
-
-    for event in events:
-        payload = event.payload or {}
-        if payload.get("validation_status") != "passed":
+    surfaces: Dict[str, Dict[str, Any]] = state["surfaces"]
+    pending: Dict[str, Dict[str, Any]] = state["pending"]
+    pending_data: Dict[str, Optional[Dict[str, Any]]] = state["pending_data"]
+    rendered_surfaces: set[str] = set(state["rendered"])
+    current_data_model: Optional[Dict[str, Any]] = state["data_model"]
+
+    for payload in payloads:
+        payload = payload or {}
+        if payload.get("validation_status") != PASSED_STATUS:
             continue
         llm_response = payload.get("llm_response")
         if isinstance(llm_response, dict):
@@ -55,31 +93,33 @@ def _extract_surface_updates(events: List[InputEvent]) -> Dict[str, Dict[str, An
         else:
             continue
 
+        # One pass reads each message type once; surface messages are replayed in
+        # order afterwards, once the event's data model and beginRendering set are known
         event_data_model: Optional[Dict[str, Any]] = None
         event_begin_rendering: set[str] = set()
+        # (surface name, surfaceUpdate message or None for beginRendering)
+        surface_messages: List[Tuple[str, Optional[Dict[str, Any]]]] = []
         for message in messages:
             message_type = message.get("type")
             if message_type == "dataModelUpdate":
                 data = message.get("data")
                 if isinstance(data, dict):
                     event_data_model = data
+            elif message_type == "surfaceUpdate":
+                surface_name = message.get("surface")
+                if surface_name:
+                    surface_messages.append((surface_name, message))
             elif message_type == "beginRendering":
                 surface_name = message.get("surface")
                 if surface_name:
                     event_begin_rendering.add(surface_name)
+                    surface_messages.append((surface_name, None))
 
         if event_data_model is not None:
             current_data_model = event_data_model
 
-        for message in messages:
-            message_type = message.get("type")
-            if message_type == "dataModelUpdate":
-                continue
-
-            if message_type == "surfaceUpdate":
-                surface_name = message.get("surface")
-                if not surface_name:
-                    continue
+        for surface_name, message in surface_messages:
+            if message is not None:
                 if surface_name in event_begin_rendering:
                     surfaces[surface_name] = {
                         "surface": message,
@@ -91,21 +131,27 @@ def _extract_surface_updates(events: List[InputEvent]) -> Dict[str, Dict[str, An
                     pending_data[surface_name] = event_data_model or current_data_model
                 continue
 
-            if message_type == "beginRendering":
-                surface_name = message.get("surface")
-                if not surface_name:
-                    continue
-                surface_update = pending.get(surface_name)
-                if surface_update:
-                    surfaces[surface_name] = {
-                        "surface": surface_update,
-                        "data_model": pending_data.get(surface_name) or event_data_model or current_data_model,
-                    }
-                    rendered_surfaces.add(surface_name)
-                continue
+            surface_update = pending.get(surface_name)
+            if surface_update:
+                surfaces[surface_name] = {
+                    "surface": surface_update,
+                    "data_model": pending_data.get(surface_name) or event_data_model or current_data_model,
+                }
+                rendered_surfaces.add(surface_name)
+
+    state["rendered"] = sorted(rendered_surfaces)
+    state["data_model"] = current_data_model
+
+
+def _surfaces_from_state(state: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Return latest surfaceUpdate and associated data per surface name."""
+    surfaces = dict(state["surfaces"])
+    rendered_surfaces = set(state["rendered"])
+    pending_data = state["pending_data"]
+    current_data_model = state["data_model"]
 
     # Fallback: if no beginRendering was seen for a surface, render the latest pending update
-    for surface_name, surface_update in pending.items():
+    for surface_name, surface_update in state["pending"].items():
         if surface_name in rendered_surfaces:
             continue
         surfaces[surface_name] = {
@@ -120,6 +166,20 @@ def _unescape_json_pointer_token(token: str) -> str:
     return token.replace("~1", "/").replace("~0", "~")
 
 
+def _list_index(token: str) -> Optional[int]:
+    try:
+        return int(token)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _compile_json_pointer(pointer: str) -> Tuple[Tuple[str, Optional[int]], ...]:
+    """Split and unescape a JSON pointer once, pre-parsing each token's list index."""
+    tokens = (_unescape_json_pointer_token(raw_token) for raw_token in pointer.lstrip("/").split("/"))
+    return tuple((token, _list_index(token)) for token in tokens)
+
+
 def _resolve_json_pointer(data: Optional[Dict[str, Any]], pointer: str) -> Any:
     """Resolve a JSON pointer (RFC 6901) within a nested dict/list."""
     if not pointer or not isinstance(data, dict):
@@ -129,19 +189,13 @@ def _resolve_json_pointer(data: Optional[Dict[str, Any]], pointer: str) -> Any:
     if not pointer.startswith("/"):
         return None
     current: Any = data
-    tokens = pointer.lstrip("/").split("/")
-    for raw_token in tokens:
-        token = _unescape_json_pointer_token(raw_token)
+    for token, index in _compile_json_pointer(pointer):
         if isinstance(current, dict):
             if token not in current:
                 return None
             current = current[token]
         elif isinstance(current, list):
-            try:
-                index = int(token)
-            except ValueError:
-                return None
-            if index < 0 or index >= len(current):
+            if index is None or index < 0 or index >= len(current):
                 return None
             current = current[index]
         else:
@@ -149,7 +203,28 @@ def _resolve_json_pointer(data: Optional[Dict[str, Any]], pointer: str) -> Any:
     return current
 
 
-def _resolve_text_value(text_value: Any, data_model: Optional[Dict[str, Any]]) -> Any:
+_POINTER_MISSING = object()
+
+
+def _lookup_json_pointer(
+    data: Optional[Dict[str, Any]],
+    pointer: str,
+    pointer_cache: Optional[Dict[str, Any]],
+) -> Any:
+    """Resolve `pointer`, memoized in `pointer_cache` (scoped to one data model)."""
+    if pointer_cache is None:
+        return _resolve_json_pointer(data, pointer)
+    value = pointer_cache.get(pointer, _POINTER_MISSING)
+    if value is _POINTER_MISSING:
+        value = pointer_cache[pointer] = _resolve_json_pointer(data, pointer)
+    return value
+
+
+def _resolve_text_value(
+    text_value: Any,
+    data_model: Optional[Dict[str, Any]],
+    pointer_cache: Optional[Dict[str, Any]] = None,
+) -> Any:
     if text_value is None:
         return None
     if not isinstance(text_value, dict):
@@ -160,13 +235,17 @@ def _resolve_text_value(text_value: Any, data_model: Optional[Dict[str, Any]]) -
         return text_value
     if not data_model:
         return text_value
-    resolved = _resolve_json_pointer(data_model, text_value.get("path", ""))
+    resolved = _lookup_json_pointer(data_model, text_value.get("path", ""), pointer_cache)
     if resolved is None:
         return text_value
     return {"literal": str(resolved)}
 
 
-def _resolve_source_value(source_value: Any, data_model: Optional[Dict[str, Any]]) -> Any:
+def _resolve_source_value(
+    source_value: Any,
+    data_model: Optional[Dict[str, Any]],
+    pointer_cache: Optional[Dict[str, Any]] = None,
+) -> Any:
     if source_value is None:
         return None
     if isinstance(source_value, str):
@@ -177,17 +256,163 @@ def _resolve_source_value(source_value: Any, data_model: Optional[Dict[str, Any]
         return source_value
     if not data_model:
         return source_value
-    resolved = _resolve_json_pointer(data_model, source_value.get("path", ""))
+    resolved = _lookup_json_pointer(data_model, source_value.get("path", ""), pointer_cache)
     if resolved is None:
         return source_value
     return {"url": str(resolved)}
 
 
+def _child_ids(kind: Optional[str], props: Any) -> List[Any]:
+    """Return the ids a container component refers to, in render order."""
+    if kind in ("Column", "Row"):
+        return (props.get("children") or {}).get("explicitList") or []
+    if kind == "Card":
+        child_id = props.get("child")
+        return [child_id] if child_id else []
+    return []
+
+
+def _leaves_first_order(child_ids_of: Dict[str, List[Any]]) -> List[str]:
+    """Kahn's algorithm over containment edges: every node after all of its children.
+
+    Nodes on a cycle, or with a cycle below them, never become ready and are
+    left out.
+    """
+    remaining: Dict[str, int] = {}
+    containers_of: Dict[Any, List[str]] = {}
+    for node_id, child_ids in child_ids_of.items():
+        count = 0
+        for child_id in child_ids:
+            if child_id in child_ids_of:
+                containers_of.setdefault(child_id, []).append(node_id)
+                count += 1
+        remaining[node_id] = count
+
+    order = [node_id for node_id, count in remaining.items() if count == 0]
+    for node_id in order:
+        for container_id in containers_of.get(node_id, ()):
+            remaining[container_id] -= 1
+            if remaining[container_id] == 0:
+                order.append(container_id)
+    return order
+
+
+ComponentBuilder = Callable[
+    [str, Dict[str, Any], List[ComponentNode], Optional[Dict[str, Any]], Optional[Dict[str, Any]]],
+    Optional[ComponentNode],
+]
+
+
+def _build_column(
+    node_id: str,
+    props: Dict[str, Any],
+    children: List[ComponentNode],
+    data_model: Optional[Dict[str, Any]],
+    pointer_cache: Optional[Dict[str, Any]],
+) -> ComponentNode | None:
+    return ComponentNode.model_construct(id=node_id, type="Column", props={"gap": props.get("gap"), "alignment": props.get("alignment")}, children=children)
+
+
+def _build_row(
+    node_id: str,
+    props: Dict[str, Any],
+    children: List[ComponentNode],
+    data_model: Optional[Dict[str, Any]],
+    pointer_cache: Optional[Dict[str, Any]],
+) -> ComponentNode | None:
+    return ComponentNode.model_construct(id=node_id, type="Row", props={"gap": props.get("gap"), "alignment": props.get("alignment"), "distribution": props.get("distribution")}, children=children)
+
+
+def _build_card(
+    node_id: str,
+    props: Dict[str, Any],
+    children: List[ComponentNode],
+    data_model: Optional[Dict[str, Any]],
+    pointer_cache: Optional[Dict[str, Any]],
+) -> ComponentNode | None:
+    return ComponentNode.model_construct(id=node_id, type="Card", children=children)
+
+
+def _build_divider(
+    node_id: str,
+    props: Dict[str, Any],
+    children: List[ComponentNode],
+    data_model: Optional[Dict[str, Any]],
+    pointer_cache: Optional[Dict[str, Any]],
+) -> ComponentNode | None:
+    return ComponentNode.model_construct(id=node_id, type="Divider")
+
+
+def _build_text(
+    node_id: str,
+    props: Dict[str, Any],
+    children: List[ComponentNode],
+    data_model: Optional[Dict[str, Any]],
+    pointer_cache: Optional[Dict[str, Any]],
+) -> ComponentNode | None:
+    resolved_text = _resolve_text_value(props.get("text"), data_model, pointer_cache)
+    return ComponentNode.model_construct(id=node_id, type="Text", props={"text": resolved_text, "usageHint": props.get("usageHint")})
+
+
+def _build_icon(
+    node_id: str,
+    props: Dict[str, Any],
+    children: List[ComponentNode],
+    data_model: Optional[Dict[str, Any]],
+    pointer_cache: Optional[Dict[str, Any]],
+) -> ComponentNode | None:
+    resolved_source = _resolve_source_value(props.get("source") or props.get("url"), data_model, pointer_cache)
+    resolved_name = _resolve_text_value(props.get("name"), data_model, pointer_cache)
+    return ComponentNode.model_construct(id=node_id, type="Icon", props={"source": resolved_source, "name": resolved_name})
+
+
+def _build_image(
+    node_id: str,
+    props: Dict[str, Any],
+    children: List[ComponentNode],
+    data_model: Optional[Dict[str, Any]],
+    pointer_cache: Optional[Dict[str, Any]],
+) -> ComponentNode | None:
+    resolved_source = _resolve_source_value(props.get("source") or props.get("url"), data_model, pointer_cache)
+    resolved_alt = _resolve_text_value(props.get("altText"), data_model, pointer_cache)
+    if resolved_source is None:
+        return None
+    if isinstance(resolved_source, dict):
+        resolved_url = resolved_source.get("url")
+        if not resolved_url:
+            return None
+    return ComponentNode.model_construct(
+        id=node_id,
+        type="Image",
+        props={
+            "source": resolved_source,
+            "altText": resolved_alt,
+            "usageHint": props.get("usageHint"),
+            "fit": props.get("fit"),
+        },
+    )
+
+
+# Component kind (the single key of a validated component definition) -> builder
+_COMPONENT_BUILDERS: Dict[str, ComponentBuilder] = {
+    "Column": _build_column,
+    "Row": _build_row,
+    "Card": _build_card,
+    "Divider": _build_divider,
+    "Text": _build_text,
+    "Icon": _build_icon,
+    "Image": _build_image,
+}
+
+
 def _build_component_tree(surface_update: Dict[str, Any], data_model: Optional[Dict[str, Any]]) -> List[ComponentNode]:
     """Convert a GenUI surfaceUpdate into nested ComponentNodes."""
     components = surface_update.get("components", [])
     id_to_def: Dict[str, Dict[str, Any]] = {}
-    referenced: set[str] = set()
+    kind_of: Dict[str, Optional[str]] = {}
+    child_ids_of: Dict[str, List[Any]] = {}
+    # child id -> first container that lists it; a defined id without a parent is a root
+    parent_of: Dict[Any, str] = {}
 
     for comp in components:
         comp_id = comp.get("id")
@@ -195,169 +420,300 @@ def _build_component_tree(surface_update: Dict[str, Any], data_model: Optional[D
         if not comp_id or not isinstance(comp_def, dict):
             continue
         id_to_def[comp_id] = comp_def
+        kind = kind_of[comp_id] = next(iter(comp_def), None)
+        child_ids = child_ids_of[comp_id] = _child_ids(kind, comp_def.get(kind))
+        for child_id in child_ids:
+            parent_of.setdefault(child_id, comp_id)
+
+    pointer_cache: Dict[str, Any] = {}
+
+    def make_node(node_id: str, children: List[ComponentNode]) -> ComponentNode | None:
+        kind = kind_of[node_id]
+        builder = _COMPONENT_BUILDERS.get(kind)
+        return builder(node_id, id_to_def[node_id][kind], children, data_model, pointer_cache) if builder else None
+
+    # Everything below no cycle is built once, leaves first, and shared by every parent
+    built: Dict[str, ComponentNode | None] = {}
+    for node_id in _leaves_first_order(child_ids_of):
+        children: List[ComponentNode] = []
+        for child_id in child_ids_of[node_id]:
+            child = built.get(child_id)
+            if child is not None:
+                children.append(child)
+        built[node_id] = make_node(node_id, children)
+
+    visiting: set[str] = set()
+
+    def build_node(root_id: str) -> ComponentNode | None:
+        """Build a node that reaches a cycle; the cycle is cut where it revisits an open ancestor."""
+        # Explicit post-order stack of [node_id, child_ids, next index, children]
+        stack: List[List[Any]] = []
+
+        def enter(node_id: str) -> Tuple[bool, ComponentNode | None]:
+            """Push `node_id`, or return (False, node) when it resolves without a visit."""
+            if node_id in built:
+                return False, built[node_id]
+            if node_id in visiting or not id_to_def.get(node_id):
+                return False, None
+            visiting.add(node_id)
+            stack.append([node_id, child_ids_of[node_id], 0, []])
+            return True, None
+
+        _, node = enter(root_id)
+        while stack:
+            frame = stack[-1]
+            node_id, child_ids, index, children = frame
+            if index < len(child_ids):
+                frame[2] = index + 1
+                pushed, child = enter(child_ids[index])
+                if not pushed and child:
+                    children.append(child)
+                continue
 
-        if "Column" in comp_def:
-            children = comp_def["Column"].get("children", {})
-            referenced.update(children.get("explicitList", []))
-        if "Row" in comp_def:
-            children = comp_def["Row"].get("children", {})
-            referenced.update(children.get("explicitList", []))
-        if "Card" in comp_def:
-            child = comp_def["Card"].get("child")
-            if child:
-                referenced.add(child)
-
-    def build_node(node_id: str, seen: set[str]) -> ComponentNode | None:
-        if node_id in seen:
-            return None
-        comp_def = id_to_def.get(node_id)
-        if not comp_def:
-            return None
+            stack.pop()
+            visiting.discard(node_id)
+            node = make_node(node_id, children)
+            if stack and node:
+                stack[-1][3].append(node)
+        return node
 
-        seen = seen | {node_id}
-        if "Column" in comp_def:
-            props = comp_def["Column"]
-            child_ids = props.get("children", {}).get("explicitList", []) or []
-            children = [child for cid in child_ids if (child := build_node(cid, seen))]
-            return ComponentNode(id=node_id, type="Column", props={"gap": props.get("gap"), "alignment": props.get("alignment")}, children=children)
-        if "Row" in comp_def:
-            props = comp_def["Row"]
-            child_ids = props.get("children", {}).get("explicitList", []) or []
-            children = [child for cid in child_ids if (child := build_node(cid, seen))]
-            return ComponentNode(id=node_id, type="Row", props={"gap": props.get("gap"), "alignment": props.get("alignment"), "distribution": props.get("distribution")}, children=children)
-        if "Card" in comp_def:
-            props = comp_def["Card"]
-            child_id = props.get("child")
-            child_node = build_node(child_id, seen) if child_id else None
-            children = [child_node] if child_node else []
-            return ComponentNode(id=node_id, type="Card", props={}, children=children)
-        if "Divider" in comp_def:
-            return ComponentNode(id=node_id, type="Divider", props={}, children=[])
-        if "Text" in comp_def:
-            props = comp_def["Text"]
-            resolved_text = _resolve_text_value(props.get("text"), data_model)
-            return ComponentNode(id=node_id, type="Text", props={"text": resolved_text, "usageHint": props.get("usageHint")}, children=[])
-        if "Icon" in comp_def:
-            props = comp_def["Icon"]
-            resolved_source = _resolve_source_value(props.get("source") or props.get("url"), data_model)
-            resolved_name = _resolve_text_value(props.get("name"), data_model)
-            return ComponentNode(id=node_id, type="Icon", props={"source": resolved_source, "name": resolved_name}, children=[])
-        if "Image" in comp_def:
-            props = comp_def["Image"]
-            resolved_source = _resolve_source_value(props.get("source") or props.get("url"), data_model)
-            resolved_alt = _resolve_text_value(props.get("altText"), data_model)
-            if resolved_source is None:
-                return None
-            if isinstance(resolved_source, dict):
-                resolved_url = resolved_source.get("url")
-                if not resolved_url:
-                    return None
-            return ComponentNode(
-                id=node_id,
-                type="Image",
-                props={
-                    "source": resolved_source,
-                    "altText": resolved_alt,
-                    "usageHint": props.get("usageHint"),
-                    "fit": props.get("fit"),
-                },
-                children=[],
-            )
+    root_nodes: List[ComponentNode] = []
+    for comp_id in id_to_def:
+        if comp_id in parent_of:
+            continue
+        # Acyclic roots are already built; only roots above a cycle need the stack walk
+        node = built[comp_id] if comp_id in built else build_node(comp_id)
+        if node is not None:
+            root_nodes.append(node)
+    return root_nodes
+
+
+def _surface_update_of(context: Any) -> Dict[str, Any] | None:
+    surface_update = context.get("surface") if isinstance(context, dict) else None
+    return surface_update if isinstance(surface_update, dict) else None
+
+
+def _build_surface(context: Any) -> List[ComponentNode] | None:
+    """Build one surface's component tree, or None when it has no usable surfaceUpdate."""
+    surface_update = _surface_update_of(context)
+    if surface_update is None:
         return None
+    return _build_component_tree(surface_update, context.get("data_model"))
 
-    root_ids = [comp_id for comp_id in id_to_def.keys() if comp_id not in referenced]
-    root_nodes = [node for rid in root_ids if (node := build_node(rid, set()))]
-    return root_nodes
 
+def _events_version(events: List[InputEvent]) -> Tuple[int, int]:
+    settled = sum(1 for event in events if event.payload.get("validation_status") != PENDING_STATUS)
+    return (events[-1].seq if events else 0, settled)
 
-def _build_ui_from_events(events: List[InputEvent]) -> UIState:
-    """Build UI state from latest validated surface updates."""
-    surfaces_raw = _extract_surface_updates(events)
-    surfaces_built: Dict[str, List[ComponentNode]] = {}
+
+def _get_ui_state(
+    session_id: str,
+    events: List[InputEvent],
+    load_snapshot: Optional[Callable[[], Tuple[Optional[Dict[str, Any]], int]]] = None,
+    surfaces: Optional[Iterable[str]] = None,
+) -> UIState:
+    """
+    Return the UI for these events, reusing the last replay when nothing
+    changed. On a miss, `load_snapshot` supplies the stored (snapshot,
+    snapshot seq) and only newer events are replayed. Only the requested
+    `surfaces` (all when None) get their component trees built; the others
+    are returned empty.
+    """
+    version = _events_version(events)
+    with _UI_CACHE_LOCK:
+        cached = _UI_CACHE.get(session_id)
+        if cached is not None and cached[0] == version:
+            _UI_CACHE.move_to_end(session_id)
+        else:
+            cached = None
+    if cached is None:
+        snapshot, snapshot_seq = load_snapshot() if load_snapshot else (None, 0)
+        state = _copy_surface_state(snapshot)
+        _apply_surface_events(state, (event.payload for event in events if event.seq > snapshot_seq))
+        cached = (version, _surfaces_from_state(state), {})
+        with _UI_CACHE_LOCK:
+            _UI_CACHE[session_id] = cached
+            _UI_CACHE.move_to_end(session_id)
+            if len(_UI_CACHE) > _UI_CACHE_SIZE:
+                _UI_CACHE.popitem(last=False)
+
+    _, surfaces_raw, built = cached
+    wanted = None if surfaces is None else set(surfaces)
+    surfaces_out: Dict[str, List[ComponentNode]] = {}
     for surface_name, context in surfaces_raw.items():
-        surface_update = context.get("surface") if isinstance(context, dict) else None
-        data_model = context.get("data_model") if isinstance(context, dict) else None
-        if not isinstance(surface_update, dict):
+        if wanted is not None and surface_name not in wanted:
+            # Listed but left empty, whether or not an earlier read already built it
+            if surface_name in built or _surface_update_of(context) is not None:
+                surfaces_out[surface_name] = []
             continue
-        surfaces_built[surface_name] = _build_component_tree(surface_update, data_model)
-    return UIState(surfaces=surfaces_built)
+        tree = built.get(surface_name)
+        if tree is None:
+            tree = _build_surface(context)
+            if tree is None:
+                continue
+            with _UI_CACHE_LOCK:
+                tree = built.setdefault(surface_name, tree)
+        surfaces_out[surface_name] = tree
+    return UIState.model_construct(surfaces=surfaces_out)
+
+
+def event_from_model(event: InputEventModel) -> InputEvent:
+    """Convert a stored event row into its API schema (columns are already typed, so skip validation)."""
+    return InputEvent.model_construct(
+        event_id=event.event_id,
+        session_id=event.session_id,
+        seq=event.seq,
+        payload=event.payload,
+    )
 
 
-def create_session() -> str:
+def create_session(db: Session) -> str:
     """Create a new session and return its session_id."""
     session_id = str(uuid4())
-    db = next(get_db())
-    try:
-        session = SessionModel(session_id=session_id, seq_counter=0)
-        db.add(session)
-        db.commit()
-        return session_id
-    finally:
-        db.close()
+    session = SessionModel(session_id=session_id, seq_counter=0)
+    db.add(session)
+    db.commit()
+    return session_id
 
 
-def list_sessions() -> List[SessionSummary]:
+def list_sessions(db: Session) -> List[SessionSummary]:
     """List all sessions with their event counts."""
-    db = next(get_db())
-    try:
-        results = (
-            db.query(
-                SessionModel.session_id,
-                func.count(InputEventModel.event_id).label('event_count')
-            )
-            .outerjoin(InputEventModel, SessionModel.session_id == InputEventModel.session_id)
-            .group_by(SessionModel.session_id)
-            .order_by(SessionModel.session_id)
-            .all()
-        )
-        
-        return [
-            SessionSummary(session_id=row.session_id, event_count=row.event_count or 0)
-            for row in results
-        ]
-    finally:
-        db.close()
-
-
-def get_session_state(session_id: str) -> SessionState:
-    """Get full session state including all events."""
-    from app.services.event_service import get_session_events
+    # Events are only ever appended (one seq per event) and removed together
+    # with their session, so seq_counter doubles as the event count
+    results = (
+        db.query(SessionModel.session_id, SessionModel.seq_counter)
+        .order_by(SessionModel.session_id)
+        .all()
+    )
     
-    db = next(get_db())
-    try:
-        # Ensure session exists
-        ensure_session(db, session_id)
-        
-        # Get all events for this session
-        events = get_session_events(session_id)
-        ui_state = _build_ui_from_events(events)
-
-        return SessionState(
-            session_id=session_id,
-            events=events,
-            ui=ui_state,
+    return [
+        SessionSummary(session_id=row.session_id, event_count=row.seq_counter or 0)
+        for row in results
+    ]
+
+
+def get_session_state(db: Session, session_id: str, surfaces: Optional[Iterable[str]] = None) -> SessionState:
+    """Get full session state including all events (component trees only for `surfaces`, when given)."""
+    # Load the session and its events together; only create it when missing
+    session = (
+        db.query(SessionModel)
+        .options(selectinload(SessionModel.events), *RAISELOAD_GUARD)
+        .filter(SessionModel.session_id == session_id)
+        .one_or_none()
+    )
+    if session is None:
+        session = ensure_session(db, session_id)
+        # The read just inserted a session, so the cached session list is stale
+        response_cache.drop("/sessions")
+        events: List[InputEvent] = []
+    else:
+        events = [event_from_model(event) for event in session.events]
+
+    def load_snapshot() -> Tuple[Optional[Dict[str, Any]], int]:
+        # Queried rather than lazy-loaded off `session`: a session deleted since the
+        # read above then just has no snapshot instead of raising ObjectDeletedError
+        row = (
+            db.query(SessionModel.ui_snapshot, SessionModel.ui_snapshot_seq)
+            .filter(SessionModel.session_id == session_id)
+            .one_or_none()
         )
-    finally:
-        db.close()
+        return (row.ui_snapshot, row.ui_snapshot_seq or 0) if row is not None else (None, 0)
 
+    # The snapshot columns are deferred: only a UI cache miss loads (and decodes) them
+    ui_state = _get_ui_state(session_id, events, load_snapshot, surfaces)
 
-def delete_session(session_id: str) -> bool:
-    """Delete a session and all its events."""
-    db = next(get_db())
-    try:
-        session = get_session(db, session_id)
-        if session is None:
-            return False
-        
-        # Delete all events for this session
-        db.query(InputEventModel).filter(InputEventModel.session_id == session_id).delete()
-        
-        # Delete the session
-        db.delete(session)
+    return SessionState(
+        session_id=session_id,
+        events=events,
+        ui=ui_state,
+    )
+
+
+def advance_ui_snapshot(db: Session, session_id: str) -> None:
+    """
+    Fold newly settled events into the session's stored replay snapshot.
+
+    Only the contiguous run of settled events right after the snapshot is
+    folded in, so a still-pending event is never skipped. The UPDATE is
+    conditional on the snapshot seq it started from; if another completion
+    advanced it first, re-read and try again.
+    """
+    for _ in range(_SNAPSHOT_ATTEMPTS):
+        row = (
+            db.query(SessionModel.ui_snapshot, SessionModel.ui_snapshot_seq)
+            .filter(SessionModel.session_id == session_id)
+            .one_or_none()
+        )
+        if row is None:
+            return
+        base_seq = row.ui_snapshot_seq or 0
+        # Find the settled prefix from the materialized status column alone
+        statuses = (
+            db.query(InputEventModel.seq, InputEventModel.validation_status)
+            .filter(InputEventModel.session_id == session_id, InputEventModel.seq > base_seq)
+            .order_by(InputEventModel.seq)
+            .all()
+        )
+        settled_seq = base_seq
+        for event in statuses:
+            if event.validation_status == PENDING_STATUS:
+                break
+            settled_seq = event.seq
+        if settled_seq == base_seq:
+            db.rollback()
+            return
+
+        # Only passed events change the surfaces, so only their payloads are loaded
+        passed_payloads = (
+            db.query(InputEventModel.payload)
+            .filter(
+                InputEventModel.session_id == session_id,
+                InputEventModel.validation_status == PASSED_STATUS,
+                InputEventModel.seq > base_seq,
+                InputEventModel.seq <= settled_seq,
+            )
+            .order_by(InputEventModel.seq)
+            .all()
+        )
+        state = _copy_surface_state(row.ui_snapshot)
+        _apply_surface_events(state, (event.payload for event in passed_payloads))
+        updated = (
+            db.query(SessionModel)
+            .filter(SessionModel.session_id == session_id, SessionModel.ui_snapshot_seq == base_seq)
+            .update(
+                {SessionModel.ui_snapshot: state, SessionModel.ui_snapshot_seq: settled_seq},
+                synchronize_session=False,
+            )
+        )
         db.commit()
-        return True
-    finally:
-        db.close()
+        if updated:
+            return
 
 
-__all__ = ["create_session", "list_sessions", "get_session_state", "delete_session", "ensure_session"]
+def delete_session(db: Session, session_id: str) -> bool:
+    """Delete a session and all its events."""
+    # event_service imports this module, so its cache hook is imported here
+    from app.services.event_service import forget_accumulated_state
+
+    # One DELETE; events are removed by the ON DELETE CASCADE foreign key
+    rows = (
+        db.query(SessionModel)
+        .filter(SessionModel.session_id == session_id)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    with _UI_CACHE_LOCK:
+        _UI_CACHE.pop(session_id, None)
+    # Cached context is keyed by session_id and seq, which a recreated session reuses
+    forget_accumulated_state(session_id)
+    return bool(rows)
+
+
+__all__ = [
+    "create_session",
+    "list_sessions",
+    "get_session_state",
+    "delete_session",
+    "ensure_session",
+    "advance_ui_snapshot",
+]
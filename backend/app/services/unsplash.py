@@ -1,33 +1,78 @@
 import os
+import threading
 import requests
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
 from typing import Any, Dict, List
 
-def search_unsplash(
+UNSPLASH_SEARCH_URL = "https://api.unsplash.com/search/photos"
+# Enough keep-alive connections for llm_service's parallel placeholder lookups
+_POOL_MAXSIZE = 8
+
+# (lowercased query, per_page, orientation) -> parsed results; identical
+# searches recur whenever a UI is regenerated
+_SEARCH_CACHE: TTLCache = TTLCache(maxsize=512, ttl=300)
+_SEARCH_CACHE_LOCK = threading.Lock()
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """Return the shared session so calls reuse warm TCP/TLS connections."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=_POOL_MAXSIZE))
+                _session = session
+    return _session
+
+
+def _fetch_results(
+    access_key: str,
     query: str,
-    per_page: int = 5,
-    orientation: str | None = None,
+    per_page: int,
+    orientation: str | None,
 ) -> List[Dict[str, Any]]:
-    access_key = os.getenv("UNSPLASH_ACCESS_KEY")
-    if not access_key:
-        raise RuntimeError("Missing UNSPLASH_ACCESS_KEY env var")
-
     headers = {"Authorization": f"Client-ID {access_key}"}
-    url = "https://api.unsplash.com/search/photos"
     params: Dict[str, Any] = {"query": query, "per_page": per_page}
     if orientation:
         params["orientation"] = orientation
 
-    r = requests.get(url, headers=headers, params=params, timeout=15)
+    r = _get_session().get(UNSPLASH_SEARCH_URL, headers=headers, params=params, timeout=15)
     r.raise_for_status()
     data = r.json()
 
-    results = []
-    for p in data.get("results", []):
-        results.append({
+    return [
+        {
             "id": p.get("id"),
             "description": p.get("description") or p.get("alt_description"),
             "author": (p.get("user") or {}).get("name"),
             "link": (p.get("links") or {}).get("html"),
             "urls": p.get("urls") or {},
-        })
-    return results
+        }
+        for p in data.get("results", [])
+    ]
+
+
+def search_unsplash(
+    query: str,
+    per_page: int = 5,
+    orientation: str | None = None,
+) -> List[Dict[str, Any]]:
+    access_key = os.getenv("UNSPLASH_ACCESS_KEY")
+    if not access_key:
+        raise RuntimeError("Missing UNSPLASH_ACCESS_KEY env var")
+
+    cache_key = (query.lower(), per_page, orientation)
+    with _SEARCH_CACHE_LOCK:
+        cached = _SEARCH_CACHE.get(cache_key)
+    if cached is not None:
+        return list(cached)
+
+    results = _fetch_results(access_key, query, per_page, orientation)
+    with _SEARCH_CACHE_LOCK:
+        _SEARCH_CACHE[cache_key] = results
+    return list(results)
@@ -16,7 +16,7 @@ export function Session() {
   const [events, setEvents] = useState<SessionState['events']>([]);
   const [error, setError] = useState<string | null>(null);
   const [loading, setLoading] = useState<boolean>(true);
-  const lastSeqRef = useRef<number | null>(null);
+  const lastVersionRef = useRef<string | null>(null);
 
   useEffect(() => {
     if (!sessionId) return;
@@ -28,12 +28,16 @@ export function Session() {
         .then(async (res) => {
           if (!res.ok) throw new Error(`Request failed: ${res.status}`);
           const data: SessionState = await res.json();
-          const nextSeq = Math.max(0, ...((data.events ?? []).map((event) => event.seq)));
-          if (isMounted && lastSeqRef.current === nextSeq) {
+          // Events start out pending and are updated in place once the LLM
+          // response lands, so the version tracks status as well as seq.
+          const nextVersion = (data.events ?? [])
+            .map((event) => `${event.seq}:${String(event.payload.validation_status ?? '')}`)
+            .join(',');
+          if (isMounted && lastVersionRef.current === nextVersion) {
             return;
           }
           if (isMounted) {
-            lastSeqRef.current = nextSeq;
+            lastVersionRef.current = nextVersion;
             setUIState(data.ui);
             setEvents(data.events ?? []);
             setLoading(false);